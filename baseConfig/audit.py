@@ -0,0 +1,25 @@
+from datetime import datetime, timezone
+
+from fastapi import BackgroundTasks
+
+from baseConfig.buffer import BufferedWriter
+from baseConfig.config import AUDIT_FLUSH_INTERVAL, AUDIT_BATCH_SIZE, AUDIT_MAX_BUFFER
+
+# Who changed what; written in bulk like the occupancy history, so records reach
+# the table up to AUDIT_FLUSH_INTERVAL seconds after the change
+audit_log = BufferedWriter("audit_log", AUDIT_BATCH_SIZE, AUDIT_MAX_BUFFER, AUDIT_FLUSH_INTERVAL)
+
+
+def audit(background_tasks: BackgroundTasks, actor: dict, action: str, target_type: str, target_id, details: dict = None):
+    """Queues an audit record once the response has been sent.
+
+    The time is taken now so that records keep the order of the changes.
+    """
+    background_tasks.add_task(audit_log.add, {
+        "actor_id": str(actor["id"]),
+        "action": action,
+        "target_type": target_type,
+        "target_id": str(target_id),
+        "details": details,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+    })
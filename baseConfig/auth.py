@@ -1,29 +1,113 @@
-from passlib.context import CryptContext
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 import jwt
 from fastapi import HTTPException
 from datetime import datetime, timedelta
-from baseConfig.config import JWT_SECRET
+from baseConfig.metrics import password_hash_latency, password_hash_rejected
+from baseConfig.config import (
+    JWT_SECRET, ACCESS_TOKEN_MINUTES, REFRESH_TOKEN_MINUTES, BCRYPT_ROUNDS, BCRYPT_MAX_WORKERS, BCRYPT_MAX_PENDING, BCRYPT_RETRY_AFTER,
+)
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Built on first use (or by warm_up) so that importing this module stays cheap
+@lru_cache(maxsize=None)
+def pwd_context():
+    from passlib.context import CryptContext
+    # Hashes made with a different cost are flagged by needs_update and upgraded on login
+    return CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+# bcrypt releases the GIL, so a small dedicated thread pool hashes in parallel
+# without competing with the request threadpool
+@lru_cache(maxsize=None)
+def _hash_executor():
+    return ThreadPoolExecutor(max_workers=BCRYPT_MAX_WORKERS, thread_name_prefix="bcrypt")
+
+_hash_pending = 0
+hash_stats = {"count": 0, "rejected": 0, "total_seconds": 0.0, "max_seconds": 0.0}
+
+def warm_up():
+    """Builds the hashing context and loads the bcrypt backend ahead of the first login."""
+    pwd_context().handler("bcrypt").get_backend()
+    _hash_executor()
 
 def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+    return pwd_context().hash(password)
 
 def verify_password(password: str, hashed: str) -> bool:
-    return pwd_context.verify(password, hashed)
+    return pwd_context().verify(password, hashed)
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+async def _offload(operation: str, fn, *args):
+    global _hash_pending
+    if _hash_pending >= BCRYPT_MAX_PENDING:
+        hash_stats["rejected"] += 1
+        password_hash_rejected.inc()
+        raise HTTPException(
+            status_code=503,
+            detail="Too many concurrent logins, retry shortly",
+            headers={"Retry-After": str(BCRYPT_RETRY_AFTER)}
+        )
+    _hash_pending += 1
+    try:
+        result, elapsed = await asyncio.get_running_loop().run_in_executor(_hash_executor(), _timed, fn, *args)
+    finally:
+        _hash_pending -= 1
+    hash_stats["count"] += 1
+    hash_stats["total_seconds"] += elapsed
+    hash_stats["max_seconds"] = max(hash_stats["max_seconds"], elapsed)
+    password_hash_latency.observe(elapsed, operation=operation)
+    return result
+
+async def ahash_password(password: str) -> str:
+    return await _offload("hash", pwd_context().hash, password)
+
+async def averify_password(password: str, hashed: str) -> tuple[bool, str | None]:
+    """Returns whether the password matches and, if the stored hash is outdated, a replacement hash."""
+    return await _offload("verify", pwd_context().verify_and_update, password, hashed)
 
-def create_access_token(user_id: str, roles: list, expires_minutes: int = 60):
+# Built once instead of on every decode
+_jwt_key = JWT_SECRET.encode()
+_jwt_algorithms = ["HS256"]
+_jwt_decoder = jwt.PyJWT(options={"require": ["exp", "sub"]})
+
+def _create_token(user_id: str, token_type: str, expires_minutes: int, **claims):
     payload = {
         "sub": str(user_id),
-        "roles": roles,
-        "exp": datetime.utcnow() + timedelta(minutes=expires_minutes)
+        "type": token_type,
+        # Sub-second precision so revocations and re-issued tokens order correctly
+        "iat": time.time(),
+        "exp": datetime.utcnow() + timedelta(minutes=expires_minutes),
+        **claims
     }
-    return jwt.encode(payload, JWT_SECRET, algorithm="HS256")
+    return jwt.encode(payload, _jwt_key, algorithm="HS256")
 
-def decode_access_token(token: str):
+def _decode_token(token: str, token_type: str):
     try:
-        return jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
+        payload = _jwt_decoder.decode(token, _jwt_key, algorithms=_jwt_algorithms)
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
     except jwt.PyJWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
+    # Tokens issued before token types existed are access tokens
+    if payload.get("type", "access") != token_type:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    return payload
+
+def create_access_token(user_id: str, roles: list, expires_minutes: int = ACCESS_TOKEN_MINUTES, site: str = None):
+    # The site claim is only there for users with a home site
+    claims = {"site": site} if site else {}
+    return _create_token(user_id, "access", expires_minutes, roles=roles, **claims)
+
+def create_refresh_token(user_id: str, expires_minutes: int = REFRESH_TOKEN_MINUTES):
+    return _create_token(user_id, "refresh", expires_minutes)
+
+def decode_access_token(token: str):
+    return _decode_token(token, "access")
+
+def decode_refresh_token(token: str):
+    return _decode_token(token, "refresh")
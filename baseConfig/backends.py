@@ -0,0 +1,438 @@
+import asyncio
+import itertools
+import json
+import uuid
+from datetime import datetime, timezone
+from functools import lru_cache
+
+from baseConfig.config import DEFAULT_SITE
+
+
+def _ident(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+def _where(columns: tuple, start: int = 1, gte: tuple = (), lt: tuple = (), gt: tuple = ()) -> str:
+    conditions = []
+    for op, group in (("=", columns), (">", gt), (">=", gte), ("<", lt)):
+        conditions += [f"{_ident(c)} {op} ${i}" for i, c in enumerate(group, start)]
+        start += len(group)
+    if not conditions:
+        return ""
+    return " WHERE " + " AND ".join(conditions)
+
+# SQL text is memoized per (table, columns) shape so that asyncpg's per-connection
+# statement cache sees identical strings and reuses the prepared statements.
+@lru_cache(maxsize=512)
+def _select_sql(table: str, filter_columns: tuple, limit_one: bool, gte: tuple = (), lt: tuple = (), order_by: str = None,
+                columns: tuple = None, gt: tuple = (), limited: bool = False) -> str:
+    column_list = ", ".join(map(_ident, columns)) if columns else "*"
+    sql = f"SELECT {column_list} FROM {_ident(table)}{_where(filter_columns, gte=gte, lt=lt, gt=gt)}"
+    if order_by:
+        sql += f" ORDER BY {_ident(order_by)}"
+    if limited:
+        # The limit is a parameter so that every page size shares one prepared statement
+        sql += f" LIMIT ${len(filter_columns) + len(gt) + len(gte) + len(lt) + 1}"
+    return sql + " LIMIT 1" if limit_one else sql
+
+@lru_cache(maxsize=512)
+def _insert_sql(table: str, columns: tuple) -> str:
+    placeholders = ", ".join(f"${i}" for i in range(1, len(columns) + 1))
+    return f"INSERT INTO {_ident(table)} ({', '.join(map(_ident, columns))}) VALUES ({placeholders}) RETURNING *"
+
+# The bulk statements below take every row in a single jsonb parameter; the table's
+# row type converts the JSON values to the column types.
+@lru_cache(maxsize=512)
+def _insert_many_sql(table: str, columns: tuple, on_conflict: str = None, returning: bool = True) -> str:
+    column_list = ", ".join(map(_ident, columns))
+    sql = (
+        f"INSERT INTO {_ident(table)} ({column_list}) "
+        f"SELECT {column_list} FROM jsonb_populate_recordset(NULL::{_ident(table)}, $1::jsonb)"
+    )
+    if on_conflict:
+        assignments = ", ".join(f"{_ident(c)} = EXCLUDED.{_ident(c)}" for c in columns if c != on_conflict)
+        sql += f" ON CONFLICT ({_ident(on_conflict)}) " + (f"DO UPDATE SET {assignments}" if assignments else "DO NOTHING")
+    return sql + " RETURNING *" if returning else sql
+
+@lru_cache(maxsize=512)
+def _update_many_sql(table: str, columns: tuple, key: str) -> str:
+    assignments = ", ".join(f"{_ident(c)} = v.{_ident(c)}" for c in columns if c != key)
+    return (
+        f"UPDATE {_ident(table)} AS t SET {assignments} "
+        f"FROM jsonb_populate_recordset(NULL::{_ident(table)}, $1::jsonb) AS v "
+        f"WHERE t.{_ident(key)} = v.{_ident(key)} RETURNING t.*"
+    )
+
+@lru_cache(maxsize=512)
+def _update_sql(table: str, columns: tuple, filter_columns: tuple) -> str:
+    assignments = ", ".join(f"{_ident(c)} = ${i}" for i, c in enumerate(columns, 1))
+    return f"UPDATE {_ident(table)} SET {assignments}{_where(filter_columns, len(columns) + 1)} RETURNING *"
+
+@lru_cache(maxsize=128)
+def _rpc_sql(function: str, params: tuple) -> str:
+    args = ", ".join(f"{_ident(p)} => ${i}" for i, p in enumerate(params, 1))
+    return f"SELECT {_ident(function)}({args})"
+
+
+async def _init_connection(conn):
+    # Mirror PostgREST's JSON shapes: json columns as Python objects,
+    # uuids and timestamps as strings.
+    for typename in ("json", "jsonb"):
+        await conn.set_type_codec(typename, encoder=json.dumps, decoder=json.loads, schema="pg_catalog")
+    for typename in ("uuid", "date", "timestamp", "timestamptz"):
+        await conn.set_type_codec(typename, encoder=str, decoder=str, schema="pg_catalog", format="text")
+
+
+class PostgresBackend:
+    """Talks to Postgres directly over a shared asyncpg connection pool."""
+
+    def __init__(self, dsn: str, min_size: int, max_size: int, statement_cache_size: int):
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.statement_cache_size = statement_cache_size
+        self._pool = None
+        self._lock = asyncio.Lock()
+
+    async def pool(self):
+        if self._pool is None:
+            async with self._lock:
+                if self._pool is None:
+                    # Imported here so that workers not using this backend never pay for it
+                    import asyncpg
+                    self._pool = await asyncpg.create_pool(
+                        self.dsn,
+                        min_size=self.min_size,
+                        max_size=self.max_size,
+                        statement_cache_size=self.statement_cache_size,
+                        init=_init_connection,
+                    )
+        return self._pool
+
+    async def fetch_one(self, table: str, filters: dict, columns: list = None):
+        pool = await self.pool()
+        sql = _select_sql(table, tuple(filters), True, columns=tuple(columns) if columns else None)
+        row = await pool.fetchrow(sql, *filters.values())
+        return dict(row) if row else None
+
+    async def fetch_all(self, table: str, filters: dict, gte: dict = None, lt: dict = None, order_by: str = None,
+                        columns: list = None, gt: dict = None, limit: int = None):
+        gte, lt, gt = gte or {}, lt or {}, gt or {}
+        pool = await self.pool()
+        sql = _select_sql(
+            table, tuple(filters), False, tuple(gte), tuple(lt), order_by,
+            tuple(columns) if columns else None, tuple(gt), limit is not None
+        )
+        args = [*filters.values(), *gt.values(), *gte.values(), *lt.values()]
+        if limit is not None:
+            args.append(limit)
+        rows = await pool.fetch(sql, *args)
+        return [dict(row) for row in rows]
+
+    async def insert(self, table: str, data: dict):
+        pool = await self.pool()
+        row = await pool.fetchrow(_insert_sql(table, tuple(data)), *data.values())
+        return dict(row)
+
+    async def insert_many(self, table: str, rows: list, returning: bool = True):
+        pool = await self.pool()
+        sql = _insert_many_sql(table, tuple(rows[0]), returning=returning)
+        if not returning:
+            await pool.execute(sql, rows)
+            return None
+        return [dict(row) for row in await pool.fetch(sql, rows)]
+
+    async def upsert(self, table: str, rows: list, on_conflict: str):
+        pool = await self.pool()
+        return [dict(row) for row in await pool.fetch(_insert_many_sql(table, tuple(rows[0]), on_conflict), rows)]
+
+    async def update_many(self, table: str, rows: list, key: str):
+        # One statement per distinct column set, so absent columns are left untouched
+        groups = {}
+        for row in rows:
+            groups.setdefault(tuple(row), []).append(row)
+        pool = await self.pool()
+        updated = []
+        async with pool.acquire() as conn, conn.transaction():
+            for columns, group in groups.items():
+                updated += [dict(row) for row in await conn.fetch(_update_many_sql(table, columns, key), group)]
+        return updated
+
+    async def update(self, table: str, data: dict, filters: dict):
+        pool = await self.pool()
+        rows = await pool.fetch(_update_sql(table, tuple(data), tuple(filters)), *data.values(), *filters.values())
+        return [dict(row) for row in rows]
+
+    async def rpc(self, function: str, params: dict):
+        pool = await self.pool()
+        return await pool.fetchval(_rpc_sql(function, tuple(params)), *params.values())
+
+    async def ping(self):
+        pool = await self.pool()
+        await pool.fetchval("select 1")
+
+    async def close(self):
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+
+class SupabaseBackend:
+    """Talks to PostgREST through the async Supabase client."""
+
+    def __init__(self, url: str, key: str):
+        self.url = url
+        self.key = key
+        self._client = None
+        self._lock = asyncio.Lock()
+
+    async def client(self):
+        if self._client is None:
+            async with self._lock:
+                if self._client is None:
+                    from supabase import acreate_client
+                    self._client = await acreate_client(self.url, self.key)
+        return self._client
+
+    async def fetch_one(self, table: str, filters: dict, columns: list = None):
+        query = (await self.client()).table(table).select(",".join(columns) if columns else "*")
+        for k, v in filters.items():
+            query = query.eq(k, v)
+        response = await query.maybe_single().execute()
+        return response.data if response else None
+
+    async def fetch_all(self, table: str, filters: dict, gte: dict = None, lt: dict = None, order_by: str = None,
+                        columns: list = None, gt: dict = None, limit: int = None):
+        query = (await self.client()).table(table).select(",".join(columns) if columns else "*")
+        for k, v in filters.items():
+            query = query.eq(k, v)
+        for k, v in (gt or {}).items():
+            query = query.gt(k, v)
+        for k, v in (gte or {}).items():
+            query = query.gte(k, v)
+        for k, v in (lt or {}).items():
+            query = query.lt(k, v)
+        if order_by:
+            query = query.order(order_by)
+        if limit is not None:
+            query = query.limit(limit)
+        response = await query.execute()
+        return response.data
+
+    async def insert(self, table: str, data: dict):
+        response = await (await self.client()).table(table).insert(data).execute()
+        return response.data[0] if response.data else None
+
+    async def insert_many(self, table: str, rows: list, returning: bool = True):
+        from postgrest.types import ReturnMethod
+        query = (await self.client()).table(table).insert(rows, returning=ReturnMethod.representation if returning else ReturnMethod.minimal)
+        response = await query.execute()
+        return response.data if returning else None
+
+    async def upsert(self, table: str, rows: list, on_conflict: str):
+        response = await (await self.client()).table(table).upsert(rows, on_conflict=on_conflict).execute()
+        return response.data
+
+    async def update_many(self, table: str, rows: list, key: str):
+        # PostgREST has no multi-row update with per-row values; send the updates concurrently
+        responses = await asyncio.gather(*(
+            self.update(table, {k: v for k, v in row.items() if k != key}, {key: row[key]})
+            for row in rows
+        ))
+        return [row for response in responses for row in response]
+
+    async def update(self, table: str, data: dict, filters: dict):
+        query = (await self.client()).table(table).update(data)
+        for k, v in filters.items():
+            query = query.eq(k, v)
+        response = await query.execute()
+        return response.data
+
+    async def rpc(self, function: str, params: dict):
+        response = await (await self.client()).rpc(function, params).execute()
+        return response.data
+
+    async def ping(self):
+        await (await self.client()).table("parking_lot").select("code").limit(1).execute()
+
+    async def close(self):
+        self._client = None
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class MemoryBackend:
+    """Process-local stand-in for the database, for local runs and benchmarks.
+
+    Rows live in per-table lists. Every call completes without yielding once its
+    simulated `latency` has passed, so each one is atomic the way a single SQL
+    statement is. The Postgres functions called through `rpc` are reimplemented
+    in Python with the same clamping rules.
+    """
+
+    # Column defaults the real schema fills in
+    DEFAULTS = {
+        "user_profile": {"id": lambda: str(uuid.uuid4()), "signup_time": _now, "site": lambda: None},
+        "user_onboard": {"approval_status": lambda: "pending", "created_at": _now},
+        "parking_lot": {"created_at": _now, "updated_at": _now, "version": lambda: 1, "site": lambda: DEFAULT_SITE},
+    }
+    SERIALS = {"user_onboard": "request_id", "parking_lot": "id", "parking_lot_history": "id", "parking_lot_rollup": "id", "audit_log": "id"}
+    UNIQUE = {"user_profile": ("employee_id", "company_email"), "parking_lot": ("code",)}
+    # Columns bumped on every update, like the parking_lot_version trigger
+    VERSIONS = {"parking_lot": "version"}
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.tables = {}
+        self._serials = {}
+        self._functions = {
+            "adjust_parking_availability": self._adjust_parking_availability,
+            "apply_parking_events": self._apply_parking_events,
+        }
+
+    async def _round_trip(self):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    def _rows(self, table: str) -> list:
+        return self.tables.setdefault(table, [])
+
+    @staticmethod
+    def _matches(row: dict, filters: dict, gt: dict = None, gte: dict = None, lt: dict = None) -> bool:
+        return (
+            all(row.get(k) == v for k, v in filters.items())
+            and all(row.get(k) is not None and row[k] > v for k, v in (gt or {}).items())
+            and all(row.get(k) is not None and row[k] >= v for k, v in (gte or {}).items())
+            and all(row.get(k) is not None and row[k] < v for k, v in (lt or {}).items())
+        )
+
+    def _new_row(self, table: str, data: dict) -> dict:
+        row = {k: default() for k, default in self.DEFAULTS.get(table, {}).items()}
+        serial = self.SERIALS.get(table)
+        if serial:
+            row[serial] = next(self._serials.setdefault(table, itertools.count(1)))
+        row.update(data)
+        for column in self.UNIQUE.get(table, ()):
+            if row.get(column) is not None and any(r.get(column) == row[column] for r in self._rows(table)):
+                raise ValueError(f'duplicate key value violates unique constraint on "{table}"."{column}"')
+        self._rows(table).append(row)
+        return row
+
+    def _update_row(self, table: str, row: dict, data: dict):
+        row.update(data)
+        version = self.VERSIONS.get(table)
+        if version:
+            row[version] = row.get(version, 0) + 1
+
+    async def fetch_one(self, table: str, filters: dict, columns: list = None):
+        await self._round_trip()
+        row = next((r for r in self._rows(table) if self._matches(r, filters)), None)
+        if row is None:
+            return None
+        return {c: row.get(c) for c in columns} if columns else dict(row)
+
+    async def fetch_all(self, table: str, filters: dict, gte: dict = None, lt: dict = None, order_by: str = None,
+                        columns: list = None, gt: dict = None, limit: int = None):
+        await self._round_trip()
+        rows = [r for r in self._rows(table) if self._matches(r, filters, gt, gte, lt)]
+        if order_by:
+            rows.sort(key=lambda r: (r.get(order_by) is None, r.get(order_by)))
+        if limit is not None:
+            rows = rows[:limit]
+        if columns:
+            return [{c: r.get(c) for c in columns} for r in rows]
+        return [dict(r) for r in rows]
+
+    async def insert(self, table: str, data: dict):
+        await self._round_trip()
+        return dict(self._new_row(table, data))
+
+    async def insert_many(self, table: str, rows: list, returning: bool = True):
+        await self._round_trip()
+        # All or nothing, like the single INSERT it stands in for
+        unique = self.UNIQUE.get(table, ())
+        for column in unique:
+            values = [row[column] for row in rows if row.get(column) is not None]
+            if len(values) != len(set(values)):
+                raise ValueError(f'duplicate key value violates unique constraint on "{table}"."{column}"')
+        existing = {(c, r.get(c)) for r in self._rows(table) for c in unique}
+        if any((c, row.get(c)) in existing for row in rows for c in unique if row.get(c) is not None):
+            raise ValueError(f'duplicate key value violates unique constraint on "{table}"')
+        inserted = [dict(self._new_row(table, row)) for row in rows]
+        return inserted if returning else None
+
+    async def upsert(self, table: str, rows: list, on_conflict: str):
+        await self._round_trip()
+        result = []
+        for row in rows:
+            existing = next((r for r in self._rows(table) if r.get(on_conflict) == row.get(on_conflict)), None)
+            if existing is None:
+                existing = self._new_row(table, row)
+            else:
+                self._update_row(table, existing, row)
+            result.append(dict(existing))
+        return result
+
+    async def update_many(self, table: str, rows: list, key: str):
+        await self._round_trip()
+        updated = []
+        for row in rows:
+            for existing in self._rows(table):
+                if existing.get(key) == row[key]:
+                    self._update_row(table, existing, row)
+                    updated.append(dict(existing))
+        return updated
+
+    async def update(self, table: str, data: dict, filters: dict):
+        await self._round_trip()
+        updated = []
+        for row in self._rows(table):
+            if self._matches(row, filters):
+                self._update_row(table, row, data)
+                updated.append(dict(row))
+        return updated
+
+    async def rpc(self, function: str, params: dict):
+        await self._round_trip()
+        if function not in self._functions:
+            raise ValueError(f"function {function} does not exist")
+        return self._functions[function](**params)
+
+    def _lot(self, code: str):
+        return next((r for r in self._rows("parking_lot") if r.get("code") == code), None)
+
+    def _adjust_parking_availability(self, lot_code: str, delta: int):
+        lot = self._lot(lot_code)
+        if lot is None:
+            return None
+        applied = 0 <= lot["availability"] + delta <= lot["capacity"]
+        if applied:
+            self._update_row("parking_lot", lot, {"availability": lot["availability"] + delta, "updated_at": _now()})
+        return {**lot, "applied": applied}
+
+    def _apply_parking_events(self, lot_code: str, events: list):
+        lot = self._lot(lot_code)
+        if lot is None:
+            return None
+        results = []
+        changed = False
+        for event in events:
+            applied = False
+            if event == "in" and lot["availability"] > 0:
+                lot["availability"] -= 1
+                applied = True
+            elif event == "out" and lot["availability"] < lot["capacity"]:
+                lot["availability"] += 1
+                applied = True
+            changed = changed or applied
+            results.append({"applied": applied, "availability": lot["availability"]})
+        if changed:
+            self._update_row("parking_lot", lot, {"updated_at": _now()})
+        return {**lot, "results": results}
+
+    async def ping(self):
+        await self._round_trip()
+
+    async def close(self):
+        pass
@@ -0,0 +1,76 @@
+import asyncio
+
+from baseConfig.bus import bus
+from baseConfig.config import STREAM_QUEUE_SIZE
+from baseConfig.serialization import dumps
+
+
+class Subscription:
+    def __init__(self, maxsize: int, site: str = None):
+        self.queue = asyncio.Queue(maxsize)
+        self.site = site
+        self.evicted = False
+
+    async def get(self, timeout: float = None):
+        """Next encoded message, None once evicted; raises TimeoutError after `timeout` seconds."""
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+
+class Broadcaster:
+    """Fans availability messages out to in-process subscribers.
+
+    Every subscriber owns a bounded queue. Publishing never waits: a subscriber
+    whose queue is full is evicted instead of slowing down the writer. A
+    subscriber limited to a site only gets that site's lots, and nothing when a
+    message has none of them.
+    """
+
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self.evictions = 0
+        self._subscribers = set()
+
+    def subscribe(self, site: str = None) -> Subscription:
+        subscription = Subscription(self.queue_size, site)
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self._subscribers.discard(subscription)
+
+    def _encode(self, message: dict, site: str = None):
+        if site is None:
+            return dumps(message).decode()
+        lots = [lot for lot in message["lots"] if lot.get("site") == site]
+        return dumps({**message, "lots": lots}).decode() if lots else None
+
+    def publish(self, message: dict):
+        # Encode once per site, not once per subscriber
+        encoded = {}
+        for subscription in tuple(self._subscribers):
+            if subscription.site not in encoded:
+                encoded[subscription.site] = self._encode(message, subscription.site)
+            if encoded[subscription.site] is None:
+                continue
+            try:
+                subscription.queue.put_nowait(encoded[subscription.site])
+            except asyncio.QueueFull:
+                self._evict(subscription)
+
+    def _evict(self, subscription: Subscription):
+        self.evictions += 1
+        self._subscribers.discard(subscription)
+        subscription.evicted = True
+        # Drop the backlog and wake the consumer so it can disconnect
+        while not subscription.queue.empty():
+            subscription.queue.get_nowait()
+        subscription.queue.put_nowait(None)
+
+    def stats(self) -> dict:
+        return {"subscribers": len(self._subscribers), "evictions": self.evictions}
+
+
+availability_broadcaster = Broadcaster(STREAM_QUEUE_SIZE)
+
+# Changes published by any worker reach the stream subscribers of every worker
+bus.subscribe("availability", availability_broadcaster.publish)
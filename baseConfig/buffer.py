@@ -0,0 +1,93 @@
+import asyncio
+import logging
+from collections import deque
+
+from baseConfig.db import insert_many
+
+logger = logging.getLogger(__name__)
+
+
+class BufferedWriter:
+    """Collects rows for `table` in memory and writes them with bulk inserts.
+
+    A background task flushes every `interval` seconds, or as soon as `batch_size`
+    rows are waiting. The buffer holds at most `max_rows`; past that new rows are
+    dropped and counted rather than growing memory while the database is down.
+    """
+
+    def __init__(self, table: str, batch_size: int, max_rows: int, interval: float, before_flush=None):
+        self.table = table
+        self.batch_size = batch_size
+        self.max_rows = max_rows
+        self.interval = interval
+        # Called before every periodic flush, e.g. to move finished aggregates into the buffer
+        self.before_flush = before_flush
+        self.written = 0
+        self.dropped = 0
+        self.failed_flushes = 0
+        self._rows = deque()
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._task = None
+
+    def add(self, row: dict) -> bool:
+        if len(self._rows) >= self.max_rows:
+            self.dropped += 1
+            return False
+        self._rows.append(row)
+        if len(self._rows) >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    def pending(self) -> list:
+        return list(self._rows)
+
+    async def flush(self):
+        while self._rows:
+            batch = [self._rows.popleft() for _ in range(min(self.batch_size, len(self._rows)))]
+            try:
+                response = await insert_many(self.table, batch, returning=False)
+            except asyncio.CancelledError:
+                # Cancelled mid-insert: keep the rows for whoever drains the buffer next
+                self._rows.extendleft(reversed(batch))
+                raise
+            if response.get("error"):
+                # Keep the rows for the next attempt
+                self.failed_flushes += 1
+                self._rows.extendleft(reversed(batch))
+                logger.warning("Flushing %d rows to %s failed: %s", len(batch), self.table, response["error"])
+                return
+            self.written += len(batch)
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if self.before_flush:
+                self.before_flush()
+            await self.flush()
+
+    def start(self):
+        if self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Lets the background task finish its current flush and exit, then drains what is left."""
+        if self._task is not None:
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._rows),
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed_flushes": self.failed_flushes,
+        }
@@ -0,0 +1,182 @@
+import asyncio
+import logging
+import time
+import uuid
+
+from baseConfig.config import BUS_URL, BUS_QUEUE_SIZE
+from baseConfig.serialization import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_PREFIX = "parkassist:"
+
+
+class InProcessBus:
+    """Pub/sub and a small key-value store shared by everything in this process.
+
+    Handlers are plain callables run synchronously by `publish`, so local state
+    is updated before the publishing request returns. This is the default for a
+    single worker; `RedisBus` extends it across workers and hosts.
+    """
+
+    def __init__(self):
+        self.published = 0
+        self.received = 0
+        self.dropped = 0
+        self._handlers = {}
+        self._kv = {}
+
+    def subscribe(self, channel: str, handler):
+        self._handlers.setdefault(channel, []).append(handler)
+
+    def publish(self, channel: str, message: dict):
+        self.published += 1
+        self._deliver(channel, message)
+
+    def _deliver(self, channel: str, message: dict):
+        for handler in self._handlers.get(channel, ()):
+            try:
+                handler(message)
+            except Exception:
+                logger.exception("Handler for %s failed", channel)
+
+    async def get(self, key: str):
+        entry = self._kv.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._kv[key]
+            return None
+        return value
+
+    async def set(self, key: str, value, ttl: float = None):
+        self._kv[key] = (value, time.monotonic() + ttl if ttl else None)
+
+    async def add(self, key: str, value, ttl: float = None) -> bool:
+        """Sets `key` only if it has no value yet; returns whether it did."""
+        if await self.get(key) is not None:
+            return False
+        await self.set(key, value, ttl)
+        return True
+
+    async def delete(self, key: str):
+        self._kv.pop(key, None)
+
+    async def ping(self):
+        pass
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    def stats(self) -> dict:
+        return {"published": self.published, "received": self.received, "dropped": self.dropped}
+
+
+class RedisBus(InProcessBus):
+    """Relays messages through Redis (or anything speaking its protocol) to the other workers.
+
+    Messages are delivered locally first, then queued for a background sender so
+    that a slow or unreachable Redis never blocks a request; past `queue_size`
+    unsent messages new ones are dropped and counted. Workers that miss messages
+    while disconnected catch up when their caches expire. The key-value store
+    lives in Redis, so every worker sees the same values.
+    """
+
+    def __init__(self, url: str, queue_size: int):
+        super().__init__()
+        self.url = url
+        # Lets a worker skip its own messages when Redis echoes them back
+        self.origin = uuid.uuid4().hex
+        self._outbox = asyncio.Queue(queue_size)
+        self._client = None
+        self._tasks = []
+
+    def publish(self, channel: str, message: dict):
+        super().publish(channel, message)
+        try:
+            self._outbox.put_nowait((CHANNEL_PREFIX + channel, dumps({"origin": self.origin, "message": message})))
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def _send(self):
+        while True:
+            channel, payload = await self._outbox.get()
+            try:
+                await self._client.publish(channel, payload)
+            except Exception as e:
+                self.dropped += 1
+                logger.warning("Publishing to %s failed: %s", channel, e)
+
+    async def _listen(self):
+        while True:
+            try:
+                pubsub = self._client.pubsub()
+                await pubsub.subscribe(*(CHANNEL_PREFIX + channel for channel in self._handlers))
+                async for item in pubsub.listen():
+                    if item["type"] != "message":
+                        continue
+                    envelope = loads(item["data"])
+                    if envelope["origin"] == self.origin:
+                        continue
+                    self.received += 1
+                    self._deliver(item["channel"].decode().removeprefix(CHANNEL_PREFIX), envelope["message"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Bus subscription lost, reconnecting: %s", e)
+                await asyncio.sleep(1)
+
+    async def get(self, key: str):
+        value = await self._client.get(CHANNEL_PREFIX + key)
+        return loads(value) if value is not None else None
+
+    async def set(self, key: str, value, ttl: float = None):
+        await self._client.set(CHANNEL_PREFIX + key, dumps(value), px=int(ttl * 1000) if ttl else None)
+
+    async def add(self, key: str, value, ttl: float = None) -> bool:
+        return bool(await self._client.set(CHANNEL_PREFIX + key, dumps(value), px=int(ttl * 1000) if ttl else None, nx=True))
+
+    async def delete(self, key: str):
+        await self._client.delete(CHANNEL_PREFIX + key)
+
+    async def ping(self):
+        if self._client is None:
+            raise RuntimeError("Bus not started")
+        await self._client.ping()
+
+    async def start(self):
+        if self._client is not None:
+            return
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("BUS_URL is set but the redis package is not installed")
+        self._client = redis.from_url(self.url)
+        self._tasks = [asyncio.create_task(self._send()), asyncio.create_task(self._listen())]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        if self._client is not None:
+            # Hand over what is still queued before disconnecting
+            while not self._outbox.empty():
+                channel, payload = self._outbox.get_nowait()
+                try:
+                    await self._client.publish(channel, payload)
+                except Exception:
+                    break
+            await self._client.aclose()
+            self._client = None
+
+
+bus = RedisBus(BUS_URL, BUS_QUEUE_SIZE) if BUS_URL else InProcessBus()
@@ -6,6 +6,113 @@ load_dotenv()
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 JWT_SECRET = os.getenv("JWT_SECRET", "supersecret")  # fallback
+# Validates hand-encoded responses against their response models
+DEBUG = os.getenv("DEBUG", "false").lower() in ("1", "true", "yes")
 
-if not SUPABASE_URL or not SUPABASE_KEY:
-    raise RuntimeError("SUPABASE_URL and SUPABASE_KEY must be set in .env")
+# Stateless mode trusts the signed token claims instead of re-reading user_profile per request;
+# keep access tokens short-lived then, revocation only lasts for their lifetime
+AUTH_STATELESS = os.getenv("AUTH_STATELESS", "false").lower() in ("1", "true", "yes")
+ACCESS_TOKEN_MINUTES = int(os.getenv("ACCESS_TOKEN_MINUTES", "5" if AUTH_STATELESS else "60"))
+REFRESH_TOKEN_MINUTES = int(os.getenv("REFRESH_TOKEN_MINUTES", str(7 * 24 * 60)))
+REVOCATION_LIST_SIZE = int(os.getenv("REVOCATION_LIST_SIZE", "10000"))
+
+# Direct Postgres access; when set it takes precedence over the Supabase REST API
+DATABASE_URL = os.getenv("DATABASE_URL")
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "2"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+# Set to 0 behind a transaction-mode pooler (e.g. Supabase's pgbouncer on port 6543)
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+
+# postgres, supabase or memory (a process-local stand-in for local runs and benchmarks);
+# defaults to postgres when DATABASE_URL is set, supabase otherwise
+DB_BACKEND = os.getenv("DB_BACKEND", "postgres" if DATABASE_URL else "supabase").lower()
+# Simulated round trip in seconds for every memory backend call
+MEMORY_DB_LATENCY = float(os.getenv("MEMORY_DB_LATENCY", "0"))
+
+# Site of parking lots created without one; matches the column default in migrations/006
+DEFAULT_SITE = "main"
+
+# Authenticated user profile cache (keyed by the JWT "sub")
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+
+# Live availability stream: per-subscriber backlog before eviction, keepalive interval in seconds
+STREAM_QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", "64"))
+STREAM_KEEPALIVE = float(os.getenv("STREAM_KEEPALIVE", "15"))
+
+# Upper bound in seconds on how stale the in-memory parking lot snapshot may get
+PARKING_LOT_CACHE_TTL = float(os.getenv("PARKING_LOT_CACHE_TTL", "5"))
+
+# Password hashing: bcrypt cost, worker threads and how many hashes may wait before /login sheds load
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+BCRYPT_MAX_WORKERS = int(os.getenv("BCRYPT_MAX_WORKERS", str(os.cpu_count() or 2)))
+BCRYPT_MAX_PENDING = int(os.getenv("BCRYPT_MAX_PENDING", "32"))
+BCRYPT_RETRY_AFTER = int(os.getenv("BCRYPT_RETRY_AFTER", "2"))
+
+# Occupancy history: seconds between bulk writes, rows per insert, rows buffered before dropping
+HISTORY_FLUSH_INTERVAL = float(os.getenv("HISTORY_FLUSH_INTERVAL", "5"))
+HISTORY_BATCH_SIZE = int(os.getenv("HISTORY_BATCH_SIZE", "500"))
+HISTORY_MAX_BUFFER = int(os.getenv("HISTORY_MAX_BUFFER", "50000"))
+
+# Audit log: seconds between bulk writes, rows per insert, rows buffered before dropping
+AUDIT_FLUSH_INTERVAL = float(os.getenv("AUDIT_FLUSH_INTERVAL", "5"))
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "500"))
+AUDIT_MAX_BUFFER = int(os.getenv("AUDIT_MAX_BUFFER", "50000"))
+
+# Rows fetched per query when streaming admin exports
+EXPORT_PAGE_SIZE = int(os.getenv("EXPORT_PAGE_SIZE", "1000"))
+
+# Responses at least this many bytes long are gzipped for clients that accept it
+GZIP_MIN_SIZE = int(os.getenv("GZIP_MIN_SIZE", "1000"))
+
+# Redis URL (redis://, rediss:// or unix://) relaying cache invalidations and availability
+# changes between workers; unset keeps everything in-process, which is only right for one worker
+BUS_URL = os.getenv("BUS_URL")
+# Messages waiting to be sent to Redis before new ones are dropped
+BUS_QUEUE_SIZE = int(os.getenv("BUS_QUEUE_SIZE", "10000"))
+
+
+def _rate(name: str, default: str):
+    # "<requests>/<seconds>", e.g. "30/60"; "0" or empty disables the limit
+    value = os.getenv(name, default).strip()
+    if value in ("", "0"):
+        return None
+    count, _, seconds = value.partition("/")
+    return int(count), float(seconds or 1)
+
+# Per-route token buckets, keyed by route and user (client IP for /signup and /login,
+# the token's user for /refresh); per worker
+RATE_LIMIT_AUTH = _rate("RATE_LIMIT_AUTH", "30/60")
+# Further /login attempts at one account (email) from one client IP
+RATE_LIMIT_LOGIN_ACCOUNT = _rate("RATE_LIMIT_LOGIN_ACCOUNT", "10/60")
+RATE_LIMIT_COMMON = _rate("RATE_LIMIT_COMMON", "120/60")
+RATE_LIMIT_GUARD = _rate("RATE_LIMIT_GUARD", "600/60")
+RATE_LIMIT_ADMIN = _rate("RATE_LIMIT_ADMIN", "300/60")
+# Buckets kept per limiter before the least recently used are forgotten
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+# Requests served at once per worker before new ones get a 503 (0 disables); streams don't count
+MAX_IN_FLIGHT = int(os.getenv("MAX_IN_FLIGHT", "256"))
+ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", "1"))
+
+# Availability forecast: minutes ahead to predict, days of minute rollups it learns from
+# and seconds between background refits
+FORECAST_HORIZONS = tuple(int(m) for m in os.getenv("FORECAST_HORIZONS", "15,30,60").split(","))
+FORECAST_HISTORY_DAYS = float(os.getenv("FORECAST_HISTORY_DAYS", "28"))
+FORECAST_REFIT_INTERVAL = float(os.getenv("FORECAST_REFIT_INTERVAL", "300"))
+
+# Idempotency-Key and replayed event ids are remembered this many seconds; keys kept per worker
+# without BUS_URL (with it they live in Redis)
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", str(24 * 3600)))
+IDEMPOTENCY_MAX_KEYS = int(os.getenv("IDEMPOTENCY_MAX_KEYS", "100000"))
+
+# Seconds startup waits for connections and caches to warm up before serving anyway
+WARMUP_TIMEOUT = float(os.getenv("WARMUP_TIMEOUT", "5"))
+# Seconds each dependency gets to answer /health/ready
+HEALTH_CHECK_TIMEOUT = float(os.getenv("HEALTH_CHECK_TIMEOUT", "2"))
+
+if DB_BACKEND not in ("postgres", "supabase", "memory"):
+    raise RuntimeError("DB_BACKEND must be one of postgres, supabase or memory")
+if DB_BACKEND == "postgres" and not DATABASE_URL:
+    raise RuntimeError("DATABASE_URL must be set in .env when DB_BACKEND is postgres")
+if DB_BACKEND == "supabase" and (not SUPABASE_URL or not SUPABASE_KEY):
+    raise RuntimeError("DATABASE_URL or SUPABASE_URL and SUPABASE_KEY must be set in .env")
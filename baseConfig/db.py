@@ -1,58 +1,92 @@
-from supabase import create_client
-from baseConfig.config import SUPABASE_URL, SUPABASE_KEY
+import time
 
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+from baseConfig.config import (
+    SUPABASE_URL, SUPABASE_KEY, DATABASE_URL, DB_BACKEND, MEMORY_DB_LATENCY,
+    DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE, DB_STATEMENT_CACHE_SIZE,
+)
+from baseConfig.backends import PostgresBackend, SupabaseBackend, MemoryBackend
+from baseConfig.metrics import db_latency, db_errors
 
-# Utility functions
-def fetch_one(table: str, filters: dict):
-    query = supabase.table(table).select("*")  # Dummy condition to start the query
-    for k, v in filters.items():
-        query = query.eq(k, v)
-    
-    final_response = {"data": None, "error": None}
-    try:
-        response = query.maybe_single().execute()
-    except Exception as e:
-        final_response["error"] = str(e)
-    else:
-        if response:
-            final_response["data"] = response.data
-    return final_response
+if DB_BACKEND == "postgres":
+    backend = PostgresBackend(DATABASE_URL, DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE, DB_STATEMENT_CACHE_SIZE)
+elif DB_BACKEND == "memory":
+    backend = MemoryBackend(MEMORY_DB_LATENCY)
+else:
+    backend = SupabaseBackend(SUPABASE_URL, SUPABASE_KEY)
 
-def fetch_all(table: str, filters: dict = None):
-    query = supabase.table(table).select("*")
-    if filters:
-        for k, v in filters.items():
-            query = query.eq(k, v)
-    final_response = {"data": None, "error": None}
+async def close():
+    await backend.close()
+
+async def _run(table: str, operation: str, call, final_response: dict):
+    """Awaits a backend call into `final_response`, timing it per table and operation."""
+    start = time.perf_counter()
     try:
-        response = query.execute()
+        final_response["data"] = await call
     except Exception as e:
         final_response["error"] = str(e)
-    else:
-        final_response["data"] = response.data
+        db_errors.inc(table=table, operation=operation)
+    db_latency.observe(time.perf_counter() - start, table=table, operation=operation)
     return final_response
 
-def insert(table: str, data: dict):
-    final_response = {"data": "success", "error": None}
-    try:
-        supabase.table(table).insert(data).execute()
-    except Exception as e:
-        final_response["error"] = str(e)
+# Utility functions
+async def fetch_one(table: str, filters: dict, columns: list = None):
+    return await _run(table, "fetch_one", backend.fetch_one(table, filters, columns=columns), {"data": None, "error": None})
 
-    return final_response
+async def fetch_all(
+    table: str,
+    filters: dict = None,
+    gte: dict = None,
+    lt: dict = None,
+    order_by: str = None,
+    columns: list = None,
+    gt: dict = None,
+    limit: int = None
+):
+    """`columns` projects the selected columns (all by default); gt/gte/lt add range conditions."""
+    return await _run(table, "fetch_all", backend.fetch_all(
+        table, filters or {}, gte=gte, lt=lt, order_by=order_by, columns=columns, gt=gt, limit=limit
+    ), {"data": None, "error": None})
 
-def update(table, data: dict, filters: dict):
+async def insert(table: str, data: dict):
+    return await _run(table, "insert", backend.insert(table, data), {"data": None, "error": None})
 
-    query = supabase.table(table).update(data)
+# Bulk helpers: every row must have the same keys (update_many excepted) and the
+# affected rows come back in "data"
+def _mixed_columns(rows: list) -> bool:
+    columns = rows[0].keys()
+    return any(row.keys() != columns for row in rows)
 
-    for k, v in filters.items():
-        query = query.eq(k, v)
-    final_response = {"data": None, "error": None}
-    try:
-        response = query.execute()
-    except Exception as e:
-        final_response["error"] = str(e)
-    else:
-        final_response["data"] = response.data
-    return final_response
\ No newline at end of file
+async def insert_many(table: str, rows: list, returning: bool = True):
+    final_response = {"data": [], "error": None}
+    if not rows:
+        return final_response
+    if _mixed_columns(rows):
+        final_response["error"] = "All rows must have the same columns"
+        return final_response
+    return await _run(table, "insert_many", backend.insert_many(table, rows, returning=returning), final_response)
+
+async def upsert(table: str, rows: list, on_conflict: str):
+    final_response = {"data": [], "error": None}
+    if not rows:
+        return final_response
+    if _mixed_columns(rows):
+        final_response["error"] = "All rows must have the same columns"
+        return final_response
+    return await _run(table, "upsert", backend.upsert(table, rows, on_conflict), final_response)
+
+async def update_many(table: str, rows: list, key: str):
+    """Updates each row matched on `key` with the other values given for it."""
+    final_response = {"data": [], "error": None}
+    if not rows:
+        return final_response
+    return await _run(table, "update_many", backend.update_many(table, rows, key), final_response)
+
+async def update(table, data: dict, filters: dict):
+    return await _run(table, "update", backend.update(table, data, filters), {"data": None, "error": None})
+
+async def rpc(function: str, params: dict):
+    return await _run(function, "rpc", backend.rpc(function, params), {"data": None, "error": None})
+
+async def ping():
+    """Round trip to the database; "error" is set when it cannot be reached."""
+    return await _run("-", "ping", backend.ping(), {"data": None, "error": None})
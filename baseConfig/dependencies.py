@@ -1,26 +1,61 @@
+import time
 from fastapi import Depends, HTTPException
 from fastapi.security import OAuth2PasswordBearer
 from baseConfig.auth import decode_access_token
 from baseConfig.db import fetch_one
+from baseConfig.cache import TTLCache
+from baseConfig.bus import bus
+from baseConfig.config import USER_CACHE_SIZE, USER_CACHE_TTL, AUTH_STATELESS, ACCESS_TOKEN_MINUTES, REVOCATION_LIST_SIZE
 # from fastapi.openapi.models import OAuthFlows as OAuthFlowsModel
 # from fastapi.security import OAuth2
 
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/user/login")
 
+# Roles come from the token, and the password hash must not be cached
+PROFILE_COLUMNS = ["id", "employee_id", "company_email", "user_status", "site"]
 
-def get_current_user(token: str = Depends(oauth2_scheme)):
+# Active user profiles by id; admin role and site changes invalidate entries
+user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+# User id -> revocation time. Entries only need to outlive the access tokens they revoke.
+revoked_users = TTLCache(maxsize=REVOCATION_LIST_SIZE, ttl=ACCESS_TOKEN_MINUTES * 60)
+
+
+def _apply_invalidation(message: dict):
+    user_cache.pop(message["user_id"])
+    revoked_users.set(message["user_id"], message["at"])
+
+bus.subscribe("users", _apply_invalidation)
+
+def invalidate_user(user_id: str):
+    """Forget a user's cached profile and revoke the access tokens issued to them so far, in every worker."""
+    bus.publish("users", {"user_id": user_id, "at": time.time()})
+
+def is_revoked(payload: dict) -> bool:
+    issued_at = payload.get("iat", 0)
+    return issued_at <= revoked_users.get(payload.get("sub"), 0)
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme)):
     payload = decode_access_token(token)
     user_id = payload.get("sub")
-    user_data = fetch_one("user_profile", {"id": user_id})
-    user = user_data.get("data")
-    if not user or not user["user_status"] == "active":
-        raise HTTPException(status_code=403, detail="User not approved")
-    user["roles"] = payload.get("roles", [])
-    return user
+    if AUTH_STATELESS:
+        if is_revoked(payload):
+            raise HTTPException(status_code=401, detail="Token revoked")
+        return {"id": user_id, "user_status": "active", "roles": payload.get("roles", []), "site": payload.get("site")}
+
+    user = user_cache.get(user_id)
+    if user is None:
+        user_data = await fetch_one("user_profile", {"id": user_id}, columns=PROFILE_COLUMNS)
+        user = user_data.get("data")
+        if not user or not user["user_status"] == "active":
+            raise HTTPException(status_code=403, detail="User not approved")
+        user_cache.set(user_id, user)
+    return {**user, "roles": payload.get("roles", [])}
 
 def require_roles(allowed_roles: list[str]):
-    def wrapper(current_user = Depends(get_current_user)):        
+    async def wrapper(current_user = Depends(get_current_user)):        
         if not any(role in current_user["roles"] for role in allowed_roles):
             raise HTTPException(status_code=403, detail="Insufficient privileges")
         return current_user
@@ -0,0 +1,214 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+
+from fastapi import HTTPException
+
+from baseConfig.config import FORECAST_HORIZONS, FORECAST_HISTORY_DAYS, FORECAST_REFIT_INTERVAL, EXPORT_PAGE_SIZE
+from baseConfig.db import fetch_all
+from baseConfig.lot_cache import parking_lots, encode_json
+
+logger = logging.getLogger(__name__)
+
+# Profiles have one slot per quarter hour of the week
+SLOT_SECONDS = 15 * 60
+WEEK_SLOTS = 7 * 24 * 4
+ROLLUP_COLUMNS = ["id", "lot_code", "bucket_start", "sum_availability", "samples"]
+
+
+def _slot(timestamp: float) -> int:
+    return int(timestamp // SLOT_SECONDS) % WEEK_SLOTS
+
+
+class AvailabilityForecaster:
+    """Predicts every lot's availability `horizons` minutes ahead from its weekly pattern.
+
+    Minute rollups are folded into a (lots x quarter hours of the week) array of
+    average availability, older weeks weighted down with a half-life of a quarter
+    of `history_days`. A forecast moves the current availability by the change the
+    profile shows between now and the horizon, so it stays anchored to the lot's
+    live count; lots or slots without history forecast no change.
+
+    The first fit reads `history_days` of rollups, later ones only the rows added
+    since, every `interval` seconds in the background. Answers are encoded once
+    per model, availability change, quarter hour, site and type. numpy is imported by the
+    first fit; without it the forecast is unavailable.
+    """
+
+    def __init__(self, horizons: tuple, history_days: float, interval: float, page_size: int):
+        self.horizons = horizons
+        self.history_days = history_days
+        self.half_life = history_days * 86400 / 4
+        self.interval = interval
+        self.page_size = page_size
+        self.fits = 0
+        self.failed_fits = 0
+        self.error = None
+        self._np = None
+        self._index = {}
+        self._sums = None
+        self._weights = None
+        self._cursor = None
+        self._fitted_at = None
+        # (lot code -> row, profile array), swapped in whole after every fit
+        self._model = None
+        self._generation = 0
+        # (site, type) -> (what the answer was computed from, (body, etag))
+        self._answers = {}
+        self._task = None
+
+    async def _new_rows(self) -> tuple:
+        """Minute rollups added since the last fit, and the id to continue from next time."""
+        rows, cursor = [], self._cursor
+        since = datetime.fromtimestamp(time.time() - self.history_days * 86400, timezone.utc).isoformat()
+        while True:
+            response = await fetch_all(
+                table="parking_lot_rollup",
+                filters={"resolution": "minute"},
+                gte={"bucket_start": since},
+                gt={"id": cursor} if cursor is not None else None,
+                order_by="id",
+                columns=ROLLUP_COLUMNS,
+                limit=self.page_size,
+            )
+            if response.get("error"):
+                raise RuntimeError(response["error"])
+            page = response.get("data") or []
+            rows += page
+            if page:
+                cursor = page[-1]["id"]
+            if len(page) < self.page_size:
+                return rows, cursor
+
+    def _fold(self, rows: list, now: float):
+        np = self._np
+        for row in rows:
+            self._index.setdefault(row["lot_code"], len(self._index))
+        lots = len(self._index)
+        if self._sums is None:
+            self._sums = np.zeros((lots, WEEK_SLOTS))
+            self._weights = np.zeros((lots, WEEK_SLOTS))
+        elif self._sums.shape[0] < lots:
+            grow = ((0, lots - self._sums.shape[0]), (0, 0))
+            self._sums = np.pad(self._sums, grow)
+            self._weights = np.pad(self._weights, grow)
+        if self._fitted_at is not None:
+            decay = 0.5 ** ((now - self._fitted_at) / self.half_life)
+            self._sums *= decay
+            self._weights *= decay
+
+        if rows:
+            count = len(rows)
+            lot_rows = np.fromiter((self._index[row["lot_code"]] for row in rows), dtype=np.intp, count=count)
+            starts = np.fromiter((datetime.fromisoformat(row["bucket_start"]).timestamp() for row in rows), dtype=float, count=count)
+            totals = np.fromiter((row["sum_availability"] for row in rows), dtype=float, count=count)
+            samples = np.fromiter((row["samples"] for row in rows), dtype=float, count=count)
+            slots = (starts // SLOT_SECONDS).astype(np.intp) % WEEK_SLOTS
+            age_weight = 0.5 ** (np.maximum(now - starts, 0) / self.half_life)
+            np.add.at(self._sums, (lot_rows, slots), totals * age_weight)
+            np.add.at(self._weights, (lot_rows, slots), samples * age_weight)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            profile = np.where(self._weights > 1e-9, self._sums / self._weights, np.nan)
+        self._model = (dict(self._index), profile)
+        self._fitted_at = now
+        self._generation += 1
+
+    async def refit(self):
+        if self._np is None:
+            import numpy
+            self._np = numpy
+        rows, cursor = await self._new_rows()
+        await asyncio.to_thread(self._fold, rows, time.time())
+        self._cursor = cursor
+        self.fits += 1
+        self.error = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refit()
+            except ImportError:
+                self.error = "numpy is not installed"
+                logger.warning("Availability forecast disabled: numpy is not installed")
+                return
+            except Exception as e:
+                self.failed_fits += 1
+                self.error = str(e)
+                logger.warning("Refitting the availability forecast failed: %s", e)
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _predict(self, lots: list, slots: tuple) -> list:
+        np = self._np
+        index, profile = self._model
+        rows = np.array([index.get(lot["code"], -1) for lot in lots], dtype=np.intp)
+        current = np.array([lot["availability"] for lot in lots], dtype=float)
+        capacity = np.array([lot["capacity"] for lot in lots], dtype=float)
+        if profile.shape[0]:
+            seasonal = profile[np.maximum(rows, 0)][:, slots]
+            change = np.nan_to_num(seasonal[:, 1:] - seasonal[:, :1])
+            change[rows < 0] = 0
+        else:
+            change = np.zeros((len(lots), len(slots) - 1))
+        return np.clip(np.rint(current[:, None] + change), 0, capacity[:, None]).astype(int).tolist()
+
+    async def forecast_json(self, site: str = None, lot_type: str = None) -> tuple:
+        """(body, etag) with the forecast of the lots of a site and type; None means any."""
+        if self._model is None:
+            raise HTTPException(
+                status_code=503,
+                detail=f"Forecast unavailable: {self.error}" if self.error else "Forecast not ready yet",
+                headers={"Retry-After": "5"}
+            )
+        _, lots_etag = await parking_lots.full_json()
+        now = time.time()
+        slots = tuple(_slot(now + minutes * 60) for minutes in (0,) + self.horizons)
+        key = (lots_etag, self._generation, slots)
+        cached = self._answers.get((site, lot_type))
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+        lots = await parking_lots.select(site, lot_type)
+        predicted = self._predict(lots, slots)
+        answer = encode_json([
+            {
+                "code": lot["code"],
+                "name": lot.get("name"),
+                "type": lot.get("type"),
+                "site": lot.get("site"),
+                "availability": lot["availability"],
+                "capacity": lot["capacity"],
+                "forecast": [{"minutes": m, "availability": a} for m, a in zip(self.horizons, row)],
+            }
+            for lot, row in zip(lots, predicted)
+        ])
+        # Like the snapshot, only combinations matching some lot are kept
+        if lots:
+            self._answers[(site, lot_type)] = (key, answer)
+        return answer
+
+    def stats(self) -> dict:
+        return {
+            "lots": len(self._index),
+            "fits": self.fits,
+            "failed_fits": self.failed_fits,
+            "fitted_at": self._fitted_at,
+            "error": self.error,
+        }
+
+
+availability_forecast = AvailabilityForecaster(FORECAST_HORIZONS, FORECAST_HISTORY_DAYS, FORECAST_REFIT_INTERVAL, EXPORT_PAGE_SIZE)
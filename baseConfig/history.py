@@ -0,0 +1,166 @@
+import time
+from datetime import datetime, timezone
+
+from fastapi import HTTPException
+
+from baseConfig.buffer import BufferedWriter
+from baseConfig.config import HISTORY_FLUSH_INTERVAL, HISTORY_BATCH_SIZE, HISTORY_MAX_BUFFER
+from baseConfig.db import fetch_all
+
+# Rollup resolutions and their bucket width in seconds
+RESOLUTIONS = {"minute": 60, "hour": 3600}
+
+
+def _iso(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat()
+
+def _epoch(value: str) -> float:
+    return datetime.fromisoformat(value).timestamp()
+
+
+class OccupancyHistory:
+    """Append-only log of availability changes with per-lot minute and hour rollups.
+
+    Raw events and rollups are buffered and written in bulk. Each process rolls up
+    only the events it saw, so several rows may exist for one bucket; they are
+    merged when queried.
+    """
+
+    def __init__(self, interval: float, batch_size: int, max_rows: int):
+        self.events = BufferedWriter("parking_lot_history", batch_size, max_rows, interval)
+        self.rollups = BufferedWriter("parking_lot_rollup", batch_size, max_rows, interval, before_flush=self._roll)
+        # (lot code, resolution, bucket start) -> aggregate of the bucket still being filled
+        self._open = {}
+
+    def record(self, lot: dict):
+        now = time.time()
+        availability = lot["availability"]
+        self.events.add({
+            "lot_code": lot["code"],
+            "availability": availability,
+            "capacity": lot["capacity"],
+            "recorded_at": _iso(now),
+        })
+        for resolution, width in RESOLUTIONS.items():
+            key = (lot["code"], resolution, now - now % width)
+            bucket = self._open.get(key)
+            if bucket is None:
+                self._open[key] = {
+                    "min": availability, "max": availability, "sum": availability,
+                    "samples": 1, "last": availability, "last_at": now,
+                }
+            else:
+                bucket["min"] = min(bucket["min"], availability)
+                bucket["max"] = max(bucket["max"], availability)
+                bucket["sum"] += availability
+                bucket["samples"] += 1
+                bucket["last"] = availability
+                bucket["last_at"] = now
+
+    def _roll(self, force: bool = False):
+        """Moves finished buckets (all of them when `force`) into the rollup write buffer."""
+        now = time.time()
+        for key in list(self._open):
+            code, resolution, start = key
+            if force or start + RESOLUTIONS[resolution] <= now:
+                bucket = self._open.pop(key)
+                self.rollups.add({
+                    "lot_code": code,
+                    "resolution": resolution,
+                    "bucket_start": _iso(start),
+                    "min_availability": bucket["min"],
+                    "max_availability": bucket["max"],
+                    "sum_availability": bucket["sum"],
+                    "samples": bucket["samples"],
+                    "last_availability": bucket["last"],
+                    "last_at": _iso(bucket["last_at"]),
+                })
+
+    def start(self):
+        self.events.start()
+        self.rollups.start()
+
+    async def stop(self):
+        self._roll(force=True)
+        await self.events.stop()
+        await self.rollups.stop()
+
+    async def raw(self, code: str, start: datetime, end: datetime) -> list:
+        response = await fetch_all(
+            table="parking_lot_history",
+            filters={"lot_code": code},
+            gte={"recorded_at": start.isoformat()},
+            lt={"recorded_at": end.isoformat()},
+            order_by="recorded_at",
+        )
+        if response.get("error"):
+            raise HTTPException(status_code=500, detail=response["error"])
+
+        # Stored rows and rows waiting to be written, like rollup()
+        start_ts, end_ts = start.timestamp(), end.timestamp()
+        rows = (response.get("data") or []) + [
+            row for row in self.events.pending()
+            if row["lot_code"] == code and start_ts <= _epoch(row["recorded_at"]) < end_ts
+        ]
+        return [
+            {"time": row["recorded_at"], "availability": row["availability"], "capacity": row["capacity"]}
+            for row in sorted(rows, key=lambda row: _epoch(row["recorded_at"]))
+        ]
+
+    async def rollup(self, code: str, start: datetime, end: datetime, resolution: str) -> list:
+        width = RESOLUTIONS[resolution]
+        first_bucket = start.timestamp() - start.timestamp() % width
+        response = await fetch_all(
+            table="parking_lot_rollup",
+            filters={"lot_code": code, "resolution": resolution},
+            gte={"bucket_start": _iso(first_bucket)},
+            lt={"bucket_start": end.isoformat()},
+        )
+        if response.get("error"):
+            raise HTTPException(status_code=500, detail=response["error"])
+
+        # Stored rows, rows waiting to be written and buckets still open in this process
+        rows = (response.get("data") or []) + [
+            row for row in self.rollups.pending()
+            if row["lot_code"] == code and row["resolution"] == resolution
+        ]
+        buckets = {}
+        for row in rows:
+            self._merge(buckets, _epoch(row["bucket_start"]), row["min_availability"], row["max_availability"],
+                        row["sum_availability"], row["samples"], row["last_availability"], _epoch(row["last_at"]))
+        for (lot_code, lot_resolution, bucket_start), b in self._open.items():
+            if lot_code == code and lot_resolution == resolution:
+                self._merge(buckets, bucket_start, b["min"], b["max"], b["sum"], b["samples"], b["last"], b["last_at"])
+
+        end_ts = end.timestamp()
+        return [
+            {
+                "time": _iso(bucket_start),
+                "min": b["min"],
+                "max": b["max"],
+                "avg": round(b["sum"] / b["samples"], 2),
+                "last": b["last"],
+                "samples": b["samples"],
+            }
+            for bucket_start, b in sorted(buckets.items())
+            if first_bucket <= bucket_start < end_ts
+        ]
+
+    @staticmethod
+    def _merge(buckets: dict, bucket_start: float, low, high, total, samples, last, last_at):
+        b = buckets.get(bucket_start)
+        if b is None:
+            buckets[bucket_start] = {"min": low, "max": high, "sum": total, "samples": samples, "last": last, "last_at": last_at}
+            return
+        b["min"] = min(b["min"], low)
+        b["max"] = max(b["max"], high)
+        b["sum"] += total
+        b["samples"] += samples
+        if last_at >= b["last_at"]:
+            b["last"], b["last_at"] = last, last_at
+
+    def stats(self) -> dict:
+        return {"events": self.events.stats(), "rollups": self.rollups.stats(), "open_buckets": len(self._open)}
+
+
+occupancy_history = OccupancyHistory(HISTORY_FLUSH_INTERVAL, HISTORY_BATCH_SIZE, HISTORY_MAX_BUFFER)
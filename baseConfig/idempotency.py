@@ -0,0 +1,111 @@
+import hashlib
+
+from fastapi import HTTPException
+from fastapi.responses import Response
+
+from baseConfig.bus import bus
+from baseConfig.cache import TTLCache
+from baseConfig.config import BUS_URL, IDEMPOTENCY_MAX_KEYS, IDEMPOTENCY_TTL
+from baseConfig.serialization import dumps
+
+PENDING = "pending"
+
+
+def fingerprint(payload) -> str:
+    return hashlib.blake2b(dumps(payload), digest_size=12).hexdigest()
+
+
+class IdempotencyStore:
+    """Remembers which keys were already handled, and what was answered, for `ttl` seconds.
+
+    Keys are reserved before the work starts so that a retry arriving while the
+    original is still running is told so instead of being applied twice. With
+    BUS_URL set the keys live in Redis and hold across workers; otherwise in a
+    bounded per-process LRU. A key retried after `ttl` is treated as new.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, shared: bool):
+        self.ttl = ttl
+        self.shared = shared
+        self.replayed = 0
+        self._local = TTLCache(maxsize, ttl)
+
+    async def reserve(self, key: str, value=PENDING):
+        """Claims `key`; returns None when it was free, otherwise what is stored under it."""
+        if self.shared:
+            if await bus.add(key, value, self.ttl):
+                return None
+            existing = await bus.get(key)
+            if existing is None:
+                # Expired in between
+                await bus.set(key, value, self.ttl)
+            return existing
+        existing = self._local.get(key)
+        if existing is None:
+            self._local.set(key, value)
+        return existing
+
+    async def complete(self, key: str, value):
+        if self.shared:
+            await bus.set(key, value, self.ttl)
+        else:
+            self._local.set(key, value)
+
+    async def release(self, key: str):
+        if self.shared:
+            await bus.delete(key)
+        else:
+            self._local.pop(key)
+
+    async def run(self, key: str, scope: str, payload: dict, handler) -> Response:
+        """Runs `handler` once per Idempotency-Key and replays its response to retries.
+
+        Only 2xx responses are kept; after an error the key is released so the
+        client can retry.
+        """
+        if not key:
+            return await handler()
+        if len(key) > 255:
+            raise HTTPException(status_code=400, detail="Idempotency-Key must be at most 255 characters")
+        store_key = f"idempotency:{scope}:{key}"
+        request_hash = fingerprint(payload)
+        stored = await self.reserve(store_key, {"state": PENDING, "request": request_hash})
+        if stored is not None:
+            if stored["request"] != request_hash:
+                raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+            if stored["state"] == PENDING:
+                raise HTTPException(
+                    status_code=409,
+                    detail="A request with this Idempotency-Key is still being processed",
+                    headers={"Retry-After": "1"}
+                )
+            self.replayed += 1
+            return Response(
+                content=stored["body"].encode(),
+                status_code=stored["status"],
+                media_type="application/json",
+                headers={**stored["headers"], "Idempotent-Replayed": "true"}
+            )
+
+        try:
+            response = await handler()
+        except BaseException:
+            await self.release(store_key)
+            raise
+        if 200 <= response.status_code < 300:
+            await self.complete(store_key, {
+                "state": "done",
+                "request": request_hash,
+                "status": response.status_code,
+                "body": response.body.decode(),
+                "headers": {k: v for k, v in response.headers.items() if k.lower() == "etag"},
+            })
+        else:
+            await self.release(store_key)
+        return response
+
+    def stats(self) -> dict:
+        return {"shared": self.shared, "replayed": self.replayed, **({} if self.shared else self._local.stats())}
+
+
+idempotency = IdempotencyStore(IDEMPOTENCY_MAX_KEYS, IDEMPOTENCY_TTL, shared=bool(BUS_URL))
@@ -0,0 +1,162 @@
+import asyncio
+import hashlib
+import time
+
+from fastapi import HTTPException
+
+from baseConfig.bus import bus
+from baseConfig.config import PARKING_LOT_CACHE_TTL
+from baseConfig.db import fetch_all
+from baseConfig.serialization import dumps
+from baseConfig.models import ParkingAvailabilityResponse, FullParkingLotResponse
+
+AVAILABILITY_FIELDS = tuple(ParkingAvailabilityResponse.model_fields)
+FULL_FIELDS = tuple(FullParkingLotResponse.model_fields)
+
+
+def encode_json(rows) -> tuple:
+    """The JSON body and a strong ETag derived from it."""
+    body = dumps(rows)
+    return body, '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+
+
+def _older(lot: dict, than: dict) -> bool:
+    # Every write bumps the row version (migrations/004)
+    if than is None or lot.get("version") is None or than.get("version") is None:
+        return False
+    return lot["version"] < than["version"]
+
+
+class ParkingLotSnapshot:
+    """In-memory copy of the parking_lot table indexed by code, and by site on demand.
+
+    Routes write through with `publish_lots`, which reaches every worker over the
+    bus; anything missed (direct database edits, dropped bus messages) becomes
+    visible after at most `ttl` seconds when the table is reloaded.
+    Response bodies and their ETags are computed once per change and per site and
+    type asked for, and shared by all readers. Only combinations matching some lot
+    are kept, so arbitrary query values cannot grow the cache.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._lots = {}
+        self._expires_at = 0.0
+        self._lock = asyncio.Lock()
+        self._loading = None
+        self._by_site = None
+        # (site, type) -> (body, etag); None stands for every site or type
+        self._availability_json = {}
+        self._full_json = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def _ensure_fresh(self):
+        if self._expires_at > time.monotonic():
+            self.hits += 1
+            return
+        async with self._lock:
+            if self._expires_at > time.monotonic():
+                self.hits += 1
+                return
+            self.misses += 1
+            # Writes landing while the table is read must win over the rows read
+            self._loading = {}
+            try:
+                response = await fetch_all(table="parking_lot")
+                if response.get("error"):
+                    raise HTTPException(status_code=500, detail=response["error"])
+                lots = {lot["code"]: lot for lot in response.get("data") or []}
+                for code, lot in self._loading.items():
+                    if not _older(lot, lots.get(code)):
+                        lots[code] = lot
+            finally:
+                self._loading = None
+            self._lots = lots
+            self._expires_at = time.monotonic() + self.ttl
+            self._changed()
+
+    def _changed(self):
+        self._by_site = None
+        self._availability_json = {}
+        self._full_json = {}
+
+    def _site_lots(self, site: str = None) -> list:
+        if site is None:
+            return list(self._lots.values())
+        if self._by_site is None:
+            by_site = {}
+            for lot in self._lots.values():
+                by_site.setdefault(lot.get("site"), []).append(lot)
+            self._by_site = by_site
+        return self._by_site.get(site, [])
+
+    async def get(self, code: str):
+        await self._ensure_fresh()
+        return self._lots.get(code)
+
+    async def all(self) -> list:
+        await self._ensure_fresh()
+        return list(self._lots.values())
+
+    async def select(self, site: str = None, lot_type: str = None) -> list:
+        """Lots of one site and type; None means any."""
+        await self._ensure_fresh()
+        lots = self._site_lots(site)
+        return lots if lot_type is None else [lot for lot in lots if lot.get("type") == lot_type]
+
+    async def availability(self, site: str = None, lot_type: str = None) -> list:
+        return [{k: lot.get(k) for k in AVAILABILITY_FIELDS} for lot in await self.select(site, lot_type)]
+
+    @staticmethod
+    def _encoded(cache: dict, key: tuple, rows: list) -> tuple:
+        encoded = encode_json(rows)
+        if rows:
+            cache[key] = encoded
+        return encoded
+
+    async def availability_json(self, site: str = None, lot_type: str = None) -> tuple:
+        """(body, etag) for the availability list of a site and type."""
+        await self._ensure_fresh()
+        key = (site, lot_type)
+        return self._availability_json.get(key) or self._encoded(
+            self._availability_json, key, await self.availability(site, lot_type)
+        )
+
+    async def full_json(self, site: str = None) -> tuple:
+        """(body, etag) for the full parking lot list of a site."""
+        await self._ensure_fresh()
+        key = (site, None)
+        return self._full_json.get(key) or self._encoded(
+            self._full_json, key, [{k: lot.get(k) for k in FULL_FIELDS} for lot in self._site_lots(site)]
+        )
+
+    def put(self, lot: dict):
+        """Write-through for a row just written; rows older than the cached one are ignored.
+
+        Concurrent writes can finish, or arrive over the bus, out of order.
+        """
+        current = self._lots.get(lot["code"])
+        if _older(lot, current):
+            return
+        merged = {**(current or {}), **lot}
+        self._lots[lot["code"]] = merged
+        if self._loading is not None:
+            self._loading[lot["code"]] = merged
+        self._changed()
+
+    def invalidate(self):
+        self._expires_at = 0.0
+
+    def stats(self) -> dict:
+        return {"size": len(self._lots), "hits": self.hits, "misses": self.misses}
+
+
+parking_lots = ParkingLotSnapshot(PARKING_LOT_CACHE_TTL)
+
+
+def publish_lots(*lots: dict):
+    """Writes rows this worker just stored into the snapshot of every worker."""
+    bus.publish("parking_lot", {"lots": list(lots)})
+
+bus.subscribe("parking_lot", lambda message: [parking_lots.put(lot) for lot in message["lots"]])
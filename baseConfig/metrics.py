@@ -0,0 +1,191 @@
+import bisect
+import time
+
+# Prometheus' default latency buckets, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(names: tuple, values: tuple, extra: tuple = ()) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names + extra[:1], values + extra[1:])]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels[n] for n in self.labels)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def set(self, value: float, **labels):
+        """Mirrors a running total kept elsewhere, e.g. a cache's hit count."""
+        self._values[self._key(labels)] = value
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        series = self._values.get(key)
+        if series is None:
+            # Per-bucket counts (not cumulative) plus a +Inf slot, sum and count
+            series = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, (counts, total, count) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, ('le', le))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {count}")
+        return lines
+
+
+class Registry:
+    """Process-local metrics in the Prometheus text format.
+
+    Collectors are callables run at scrape time to refresh series that mirror
+    state kept elsewhere (cache sizes, buffer depths, ...).
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labels: tuple = ()) -> Counter:
+        return self.register(Counter(name, documentation, labels))
+
+    def gauge(self, name: str, documentation: str, labels: tuple = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labels))
+
+    def histogram(self, name: str, documentation: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+    def collector(self, fn):
+        self._collectors.append(fn)
+        return fn
+
+    def render(self) -> str:
+        for collect in self._collectors:
+            collect()
+        lines = []
+        for metric in self._metrics:
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.counter("http_requests_total", "HTTP requests by route and status", ("method", "route", "status"))
+http_errors = registry.counter("http_request_errors_total", "HTTP requests answered with a 5xx or an unhandled exception", ("method", "route"))
+http_latency = registry.histogram("http_request_duration_seconds", "HTTP request latency", ("method", "route"))
+http_in_flight = registry.gauge("http_requests_in_flight", "HTTP requests currently being served")
+db_latency = registry.histogram("db_query_duration_seconds", "Database helper latency", ("table", "operation"))
+db_errors = registry.counter("db_query_errors_total", "Database helper calls that failed", ("table", "operation"))
+# Mirrors of counters kept by the caches, buffers and broadcaster; refreshed by collectors at scrape time
+cache_hits = registry.counter("cache_hits_total", "Cache lookups served from memory", ("cache",))
+cache_misses = registry.counter("cache_misses_total", "Cache lookups that went to the database", ("cache",))
+cache_entries = registry.gauge("cache_entries", "Entries currently cached", ("cache",))
+stream_subscribers = registry.gauge("availability_stream_subscribers", "Open availability SSE/WebSocket subscribers")
+stream_evictions = registry.counter("availability_stream_evictions_total", "Subscribers dropped for falling behind")
+history_pending = registry.gauge("history_buffer_rows", "Rows waiting to be written", ("table",))
+history_written = registry.counter("history_rows_written_total", "Rows written by the history buffers", ("table",))
+history_dropped = registry.counter("history_rows_dropped_total", "Rows dropped because a history buffer was full", ("table",))
+bus_messages = registry.counter("bus_messages_total", "Pub/sub messages published, received from other workers or dropped", ("outcome",))
+password_hash_latency = registry.histogram(
+    "password_hash_duration_seconds", "bcrypt hash/verify time on the worker pool", ("operation",),
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 2.0)
+)
+password_hash_rejected = registry.counter("password_hash_rejected_total", "Hash requests shed because the bcrypt pool was saturated")
+rate_limited = registry.counter("rate_limited_total", "Requests rejected with a 429 by a rate limiter", ("limiter",))
+admission_rejected = registry.counter("admission_rejected_total", "Requests shed with a 503 because too many were in flight")
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, in-flight requests and errors per route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        http_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_in_flight.dec()
+            # The matched route template keeps label cardinality bounded. Newer FastAPI
+            # releases leave the router prefix off scope["route"] and record the full
+            # template on the effective route context instead.
+            matched = scope.get("fastapi", {}).get("effective_route_context") or scope.get("route")
+            route = getattr(matched, "path_format", None) or "unmatched"
+            method = scope["method"]
+            http_latency.observe(time.perf_counter() - start, method=method, route=route)
+            http_requests.inc(method=method, route=route, status=str(status))
+            if status >= 500:
+                http_errors.inc(method=method, route=route)
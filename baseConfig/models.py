@@ -1,5 +1,7 @@
-from pydantic import BaseModel
-from typing import List, Optional
+from datetime import datetime
+from pydantic import BaseModel, Field
+from baseConfig.config import DEFAULT_SITE
+from typing import Any, Dict, List, Optional
 from enum import Enum
 from typing_extensions import Literal
 
@@ -22,6 +24,9 @@ class LoginRequest(BaseModel):
     company_email: str
     password: str
 
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
 class ParkingLot(BaseModel):
     id: int
     code: str
@@ -41,20 +46,32 @@ class UserFilter(BaseModel):
     company_email: Optional[str] = None
     user_status: Optional[str] = None
 
+class UserListRequest(UserFilter):
+    # Keyset pagination: pass the previous page's next_cursor to continue
+    cursor: Optional[str] = None
+    limit: int = Field(default=100, ge=1, le=1000)
+
 class UserResponse(BaseModel):
     employee_id: str
     company_email: str
     roles: List[str]
     user_status: str
     signup_time: str
+    site: Optional[str] = None
 
 class UserListResponse(BaseModel):
     users: List[UserResponse]
+    next_cursor: Optional[str] = None
 
 class ApprovalUpdateRequest(BaseModel):
     request_id: int
     approval_status: Literal["accepted", "rejected"]
 
+class SiteAssignmentRequest(BaseModel):
+    employee_id: str
+    # None lets the user see every site by default
+    site: Optional[str] = None
+
 class RoleModificationRequest(BaseModel):
     employee_id: str
     user_role: list[Literal["employee", "guard", "admin"]]
@@ -75,6 +92,7 @@ class BaseParkingLot(BaseModel):
     code: str
     name: str
     type: str
+    site: str = DEFAULT_SITE
 
 class ParkingLotDetails(BaseParkingLot):
     capacity: int
@@ -85,16 +103,20 @@ class ParkingLotResponse(ParkingLotDetails):
 
 class FullParkingLotResponse(ParkingLotResponse):
     availability: int
+    # Row version, also sent as the ETag; pass it back in If-Match to update conditionally
+    version: Optional[int] = None
     
 class ParkingLotUpdateRequest(BaseModel):
     code: str
     name: Optional[str] = None
     type: Optional[str] = None
+    site: Optional[str] = None
     capacity: Optional[int] = None
 
 class ParkingAvailabilityResponse(BaseParkingLot):
     availability: int
     updated_at: str
+    version: Optional[int] = None
 
 class UpdateAvailabilityRequest(BaseModel):
     parking_lot_code: str
@@ -107,3 +129,50 @@ class UpdateAvailabilityResponse(ParkingAvailabilityResponse):
 class BulkUpdateRequest(BaseModel):
     parking_lot_code: str
     new_availability: int
+
+class BatchUpdateAvailabilityRequest(BaseModel):
+    # Events are applied in list order, per parking lot
+    events: List[UpdateAvailabilityRequest] = Field(min_length=1, max_length=1000)
+
+class BatchEventResult(BaseModel):
+    parking_lot_code: str
+    event_type: str
+    applied: bool
+    availability: Optional[int] = None
+    message: str
+
+class BatchUpdateAvailabilityResponse(BaseModel):
+    results: List[BatchEventResult]
+
+class QueuedEvent(UpdateAvailabilityRequest):
+    # Unique per device; an event_id is applied at most once
+    event_id: str = Field(min_length=1, max_length=128)
+    occurred_at: datetime
+
+class ReplayEventsRequest(BaseModel):
+    device_id: str = Field(min_length=1, max_length=128)
+    events: List[QueuedEvent] = Field(min_length=1, max_length=1000)
+
+class ReplayEventResult(BatchEventResult):
+    event_id: str
+    duplicate: bool
+
+class ReplayEventsResponse(BaseModel):
+    results: List[ReplayEventResult]
+
+class ForecastPoint(BaseModel):
+    minutes: int
+    availability: int
+
+class ParkingForecastResponse(BaseParkingLot):
+    availability: int
+    capacity: int
+    forecast: List[ForecastPoint]
+
+class OccupancyHistoryResponse(BaseModel):
+    code: str
+    resolution: Literal["raw", "minute", "hour"]
+    start: str
+    end: str
+    # raw: {time, availability, capacity}; minute/hour: {time, min, max, avg, last, samples}
+    points: List[Dict[str, Any]]
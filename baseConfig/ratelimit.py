@@ -0,0 +1,151 @@
+import math
+import time
+from collections import OrderedDict
+
+from fastapi import HTTPException, Request
+from fastapi.responses import JSONResponse
+
+from baseConfig.auth import decode_access_token, decode_refresh_token
+from baseConfig.config import RATE_LIMIT_MAX_KEYS
+from baseConfig.metrics import rate_limited, admission_rejected
+
+
+class TokenBuckets:
+    """One token bucket per key, refilled at `count` tokens per `period` seconds.
+
+    A bucket is just (tokens, last refill time); buckets are kept in LRU order and
+    the least recently used one is dropped past `max_keys`, which at worst hands
+    a forgotten client a fresh bucket.
+    """
+
+    def __init__(self, count: int, period: float, max_keys: int):
+        self.capacity = count
+        self.rate = count / period
+        self.max_keys = max_keys
+        self.evictions = 0
+        self._buckets = OrderedDict()
+
+    def take(self, key) -> float:
+        """Takes a token for `key`: 0 when allowed, otherwise the seconds until one is available."""
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            tokens = self.capacity
+            if len(self._buckets) >= self.max_keys:
+                self._buckets.popitem(last=False)
+                self.evictions += 1
+        else:
+            tokens = min(self.capacity, bucket[0] + (now - bucket[1]) * self.rate)
+            self._buckets.move_to_end(key)
+        if tokens < 1:
+            self._buckets[key] = (tokens, now)
+            return (1 - tokens) / self.rate
+        self._buckets[key] = (tokens - 1, now)
+        return 0.0
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+def _client_ip(request: Request) -> str:
+    # Behind the reverse proxy this is the forwarded client address (uvicorn --proxy-headers)
+    return request.client.host if request.client else "unknown"
+
+async def _json_field(request: Request, field: str):
+    # FastAPI keeps the body, so reading it here does not consume it for the route
+    try:
+        body = await request.json()
+    except ValueError:
+        return None
+    value = body.get(field) if isinstance(body, dict) else None
+    return value if isinstance(value, str) else None
+
+async def client_identity(request: Request) -> str:
+    # The token is only checked for its signature here; get_current_user does the rest
+    authorization = request.headers.get("authorization", "")
+    if authorization.lower().startswith("bearer "):
+        try:
+            return "user:" + decode_access_token(authorization[7:])["sub"]
+        except HTTPException:
+            pass
+    return "ip:" + _client_ip(request)
+
+async def ip_identity(request: Request) -> str:
+    """The client IP alone, whatever credentials the request carries."""
+    return "ip:" + _client_ip(request)
+
+async def login_identity(request: Request) -> str:
+    """The submitted email from one client IP; an extra, tighter limit on guessing at one account."""
+    email = await _json_field(request, "company_email")
+    return "login:" + (email or "").strip().lower() + "|" + _client_ip(request)
+
+async def refresh_identity(request: Request) -> str:
+    """The user a refresh token was issued to; malformed or invalid tokens fall back to the client IP."""
+    token = await _json_field(request, "refresh_token")
+    if token:
+        try:
+            return "user:" + decode_refresh_token(token)["sub"]
+        except HTTPException:
+            pass
+    return "ip:" + _client_ip(request)
+
+def rate_limit(name: str, limit: tuple, identity=client_identity):
+    """Router dependency limiting each caller per route.
+
+    `limit` is (requests, seconds) from config, or None to disable. Callers are told
+    apart by `identity`, by default the user (or client IP when unauthenticated). Put
+    it first in the router's dependencies so throttled requests are rejected before any work.
+    """
+    async def no_limit():
+        pass
+
+    if not limit:
+        return no_limit
+
+    buckets = TokenBuckets(*limit, RATE_LIMIT_MAX_KEYS)
+
+    async def dependency(request: Request):
+        route = getattr(request.scope.get("route"), "path", request.url.path)
+        retry_after = buckets.take((route, await identity(request)))
+        if retry_after:
+            rate_limited.inc(limiter=name)
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests, slow down",
+                headers={"Retry-After": str(math.ceil(retry_after))}
+            )
+
+    dependency.buckets = buckets
+    return dependency
+
+
+class AdmissionMiddleware:
+    """Answers 503 straight away once `max_in_flight` requests are being served.
+
+    Long-lived streams are listed in `exempt` (path prefixes) so that open
+    subscriptions do not use up the budget.
+    """
+
+    def __init__(self, app, max_in_flight: int, retry_after: int, exempt: tuple = ()):
+        self.app = app
+        self.max_in_flight = max_in_flight
+        self.retry_after = retry_after
+        self.exempt = tuple(exempt)
+        self.in_flight = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.max_in_flight or scope["path"].startswith(self.exempt):
+            return await self.app(scope, receive, send)
+        if self.in_flight >= self.max_in_flight:
+            admission_rejected.inc()
+            response = JSONResponse(
+                {"detail": "Server busy, retry shortly"},
+                status_code=503,
+                headers={"Retry-After": str(self.retry_after)}
+            )
+            return await response(scope, receive, send)
+        self.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
@@ -0,0 +1,38 @@
+import json
+from functools import lru_cache
+
+from fastapi import Response
+from pydantic import TypeAdapter
+
+from baseConfig.config import DEBUG
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(obj) -> bytes:
+    """Compact JSON bytes, through orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":")).encode()
+
+def loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+@lru_cache(maxsize=None)
+def _adapter(model) -> TypeAdapter:
+    return TypeAdapter(model)
+
+def json_response(content, model=None, status_code: int = 200, headers: dict = None) -> Response:
+    """Encodes `content` straight to a JSON response, skipping FastAPI's response_model pass.
+
+    With DEBUG on, `content` is still validated against `model` so shape drift
+    shows up in development.
+    """
+    if DEBUG and model is not None:
+        _adapter(model).validate_python(content)
+    return Response(content=dumps(content), status_code=status_code, headers=headers, media_type="application/json")
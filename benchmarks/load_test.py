@@ -0,0 +1,156 @@
+"""Drives the main API flows in-process and reports throughput, latency and lost updates.
+
+Runs against the memory backend unless DB_BACKEND (or DATABASE_URL / SUPABASE_*)
+says otherwise; the benchmark users and lots are upserted before the run.
+
+    python benchmarks/load_test.py
+    python benchmarks/load_test.py --requests 5000 --concurrency 100
+    MEMORY_DB_LATENCY=0.005 python benchmarks/load_test.py --json
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if not os.getenv("DATABASE_URL") and not os.getenv("SUPABASE_URL"):
+    os.environ.setdefault("DB_BACKEND", "memory")
+# Login cost is measured separately from the rest; keep bcrypt cheap unless asked otherwise
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+# A handful of benchmark users would otherwise mostly measure their own rate limits
+for name in ("RATE_LIMIT_AUTH", "RATE_LIMIT_LOGIN_ACCOUNT", "RATE_LIMIT_COMMON", "RATE_LIMIT_GUARD", "RATE_LIMIT_ADMIN"):
+    os.environ.setdefault(name, "0")
+
+import httpx
+
+from main import app
+from baseConfig.auth import hash_password
+from baseConfig.db import fetch_one, upsert
+
+PREFIX = "/api/v1"
+PASSWORD = "benchmark"
+HOT_LOT = {"code": "BENCH-HOT", "name": "Benchmark hot lot", "type": "car", "capacity": 50, "availability": 25}
+LOTS = [HOT_LOT] + [
+    {"code": f"BENCH-{i}", "name": f"Benchmark lot {i}", "type": "car", "capacity": 100, "availability": 100}
+    for i in range(20)
+]
+
+
+async def seed(users: int):
+    hashed = hash_password(PASSWORD)
+    rows = [
+        {"employee_id": f"bench-{role}-{i}", "company_email": f"bench-{role}-{i}@example.com",
+         "password": hashed, "roles": [role], "user_status": "active"}
+        for role in ("admin", "guard", "employee")
+        for i in range(users)
+    ]
+    for table, data, key in (("user_profile", rows, "employee_id"), ("parking_lot", LOTS, "code")):
+        response = await upsert(table, data, on_conflict=key)
+        if response.get("error"):
+            raise SystemExit(f"Seeding {table} failed: {response['error']}")
+
+
+async def login(client, role: str, i: int = 0) -> dict:
+    response = await client.post(PREFIX + "/user/login", json={
+        "company_email": f"bench-{role}-{i}@example.com", "password": PASSWORD,
+    })
+    response.raise_for_status()
+    return {"Authorization": "Bearer " + response.json()["access_token"]}
+
+
+async def run(name: str, total: int, concurrency: int, call) -> dict:
+    """Calls `call(i)` `total` times with at most `concurrency` in flight."""
+    latencies = []
+    errors = shed = 0
+    queue = iter(range(total))
+
+    async def worker():
+        nonlocal errors, shed
+        for i in queue:
+            start = time.perf_counter()
+            try:
+                response = await call(i)
+                if response.status_code in (429, 503):
+                    shed += 1
+                elif response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    return {
+        "scenario": name,
+        "requests": total,
+        "errors": errors,
+        "shed": shed,
+        "seconds": round(elapsed, 3),
+        "throughput": round(total / elapsed, 1),
+        "p50_ms": round(quantiles[49] * 1000, 2),
+        "p99_ms": round(quantiles[98] * 1000, 2),
+    }
+
+
+async def guard_burst(client, headers: dict, total: int, concurrency: int) -> dict:
+    """Concurrent in/out events on one lot; every applied event must show up in the final availability."""
+    await upsert("parking_lot", [HOT_LOT], on_conflict="code")
+    applied = {"in": 0, "out": 0}
+
+    async def event(i):
+        event_type = "in" if i % 2 else "out"
+        response = await client.post(PREFIX + "/guard/parking/update_availability", headers=headers, json={
+            "parking_lot_code": HOT_LOT["code"], "event_type": event_type,
+        })
+        if response.status_code == 200 and response.json()["message"] == "Availability updated successfully":
+            applied[event_type] += 1
+        return response
+
+    result = await run("guard in/out burst", total, concurrency, event)
+    lot = (await fetch_one("parking_lot", {"code": HOT_LOT["code"]})).get("data")
+    expected = HOT_LOT["availability"] - applied["in"] + applied["out"]
+    result["lost_updates"] = abs(expected - lot["availability"])
+    return result
+
+
+async def main(args):
+    await seed(args.users)
+    transport = httpx.ASGITransport(app=app)
+    async with app.router.lifespan_context(app), httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        admin, guard, employee = [await login(client, role) for role in ("admin", "guard", "employee")]
+        results = [
+            await run("login", args.logins, args.login_concurrency,
+                      lambda i: client.post(PREFIX + "/user/login", json={
+                          "company_email": f"bench-employee-{i % args.users}@example.com", "password": PASSWORD,
+                      })),
+            await run("availability poll", args.requests, args.concurrency,
+                      lambda i: client.get(PREFIX + "/common/parking/availability", headers=employee)),
+            await guard_burst(client, guard, args.requests, args.concurrency),
+            await run("admin user listing", args.requests // 10 or 1, args.concurrency,
+                      lambda i: client.post(PREFIX + "/admin/users", headers=admin, json={"limit": 100})),
+        ]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'scenario':<22}{'requests':>10}{'errors':>8}{'shed':>6}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'lost':>6}")
+    for r in results:
+        print(f"{r['scenario']:<22}{r['requests']:>10}{r['errors']:>8}{r['shed']:>6}{r['throughput']:>10}"
+              f"{r['p50_ms']:>10}{r['p99_ms']:>10}{r.get('lost_updates', ''):>6}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000, help="requests per scenario")
+    parser.add_argument("--logins", type=int, default=200, help="requests for the login scenario")
+    parser.add_argument("--concurrency", type=int, default=50)
+    # Above BCRYPT_MAX_PENDING logins are shed with 503s instead of queueing
+    parser.add_argument("--login-concurrency", type=int, default=16)
+    parser.add_argument("--users", type=int, default=20, help="benchmark users seeded per role")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,100 @@
+"""Measures how long a fresh worker takes to import the app and finish its startup hook.
+
+Each run is a new interpreter, as for a freshly spawned worker or container. Exits
+with status 1 when the median startup exceeds the budget; the test suite runs
+the same measurement.
+Runs against the memory backend unless DB_BACKEND (or DATABASE_URL / SUPABASE_*)
+says otherwise.
+
+    python benchmarks/startup_time.py
+    python benchmarks/startup_time.py --runs 10 --budget 0.5
+    python benchmarks/startup_time.py --importtime   # slowest imports of one run
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Median seconds from a fresh interpreter to the end of the startup hook; tests/test_startup_time.py enforces it
+BUDGET = 0.8
+
+CHILD = """
+import time
+start = time.perf_counter()
+import asyncio, json, main
+imported = time.perf_counter()
+
+async def boot():
+    async with main.app.router.lifespan_context(main.app):
+        return time.perf_counter()
+
+ready = asyncio.run(boot())
+print(json.dumps({"import": imported - start, "startup": ready - start}))
+"""
+
+
+def child_env() -> dict:
+    env = dict(os.environ)
+    if not env.get("DATABASE_URL") and not env.get("SUPABASE_URL"):
+        env.setdefault("DB_BACKEND", "memory")
+    return env
+
+
+def measure() -> dict:
+    result = subprocess.run(
+        [sys.executable, "-c", CHILD], cwd=ROOT, env=child_env(), capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(count: int) -> list:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"], cwd=ROOT, env=child_env(),
+        capture_output=True, text=True, check=True
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        parts = line.removeprefix("import time:").split("|")
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            rows.append((int(parts[1]), parts[2].strip()))
+    # Only top-level packages, cumulative time
+    rows = [(us, name) for us, name in rows if "." not in name]
+    return sorted(rows, reverse=True)[:count]
+
+
+def main(args):
+    runs = [measure() for _ in range(args.runs)]
+    results = {
+        phase: {
+            "median_s": round(statistics.median(r[phase] for r in runs), 3),
+            "max_s": round(max(r[phase] for r in runs), 3),
+        }
+        for phase in ("import", "startup")
+    }
+    results["budget_s"] = args.budget
+    results["within_budget"] = results["startup"]["median_s"] <= args.budget
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"{'phase':<10}{'median s':>10}{'max s':>10}")
+        for phase in ("import", "startup"):
+            print(f"{phase:<10}{results[phase]['median_s']:>10}{results[phase]['max_s']:>10}")
+        print(f"budget {args.budget}s: {'ok' if results['within_budget'] else 'EXCEEDED'}")
+        if args.importtime:
+            print(f"\n{'package':<30}{'ms':>8}")
+            for us, name in slowest_imports(15):
+                print(f"{name:<30}{us / 1000:>8.1f}")
+    return 0 if results["within_budget"] else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters to start")
+    parser.add_argument("--budget", type=float, default=BUDGET, help="allowed median startup in seconds")
+    parser.add_argument("--importtime", action="store_true", help="also list the slowest top-level imports")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    sys.exit(main(parser.parse_args()))
@@ -1,8 +1,29 @@
+import asyncio
+import logging
 from fastapi.openapi.utils import get_openapi
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi import FastAPI
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi import FastAPI, Response
+from fastapi.responses import JSONResponse
+from contextlib import asynccontextmanager
+from baseConfig import auth, db
+from baseConfig.config import GZIP_MIN_SIZE, MAX_IN_FLIGHT, ADMISSION_RETRY_AFTER, WARMUP_TIMEOUT, HEALTH_CHECK_TIMEOUT
+from baseConfig.history import occupancy_history
+from baseConfig.audit import audit_log
+from baseConfig.forecast import availability_forecast
+from baseConfig.broadcast import availability_broadcaster
+from baseConfig.bus import bus
+from baseConfig.dependencies import user_cache
+from baseConfig.lot_cache import parking_lots
+from baseConfig.metrics import (
+    registry, MetricsMiddleware, cache_hits, cache_misses, cache_entries,
+    stream_subscribers, stream_evictions, history_pending, history_written, history_dropped, bus_messages,
+)
+from baseConfig.ratelimit import AdmissionMiddleware
 from routers import user, admin, parking
 
+logger = logging.getLogger(__name__)
+
 origins = [
     "https://parkassistapi.dharapx.duckdns.org",
     "http://localhost:3000",  # for local development
@@ -31,10 +52,43 @@ def custom_openapi():
     app.openapi_schema = openapi_schema
     return app.openapi_schema
 
+async def warm_up():
+    # Opens the database connections, loads the parking lot snapshot and the bcrypt backend
+    # before the first requests need them; a failure here is reported by /health/ready instead
+    try:
+        await asyncio.wait_for(
+            asyncio.gather(asyncio.to_thread(auth.warm_up), parking_lots.availability_json()),
+            WARMUP_TIMEOUT
+        )
+    except Exception as e:
+        logger.warning("Warm-up incomplete, serving anyway: %r", e)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await bus.start()
+    occupancy_history.start()
+    audit_log.start()
+    await warm_up()
+    availability_forecast.start()
+    yield
+    await availability_forecast.stop()
+    await occupancy_history.stop()
+    await audit_log.stop()
+    await bus.stop()
+    await db.close()
+
 app = FastAPI(
     title="Parking Tracker API",
     description="API for tracking parking lot availability",
     version="0.0.1",
+    lifespan=lifespan,
+)
+# Innermost of the middleware so that its 503s still carry CORS headers and show up in the metrics
+app.add_middleware(
+    AdmissionMiddleware,
+    max_in_flight=MAX_IN_FLIGHT,
+    retry_after=ADMISSION_RETRY_AFTER,
+    exempt=("/metrics", "/health", "/api/v1/common/parking/availability/stream"),
 )
 app.add_middleware(
     CORSMiddleware,
@@ -43,10 +97,56 @@ app.add_middleware(
     allow_methods=["*"],    # Allow all methods (GET, POST, PUT, etc.)
     allow_headers=["*"],    # Allow all headers
 )
+# Starlette leaves text/event-stream responses uncompressed, so the SSE stream is unaffected
+app.add_middleware(GZipMiddleware, minimum_size=GZIP_MIN_SIZE)
+app.add_middleware(MetricsMiddleware)
 app.openapi = custom_openapi
 
+@registry.collector
+def collect_state():
+    for name, cache in (("user", user_cache), ("parking_lot", parking_lots)):
+        stats = cache.stats()
+        cache_hits.set(stats["hits"], cache=name)
+        cache_misses.set(stats["misses"], cache=name)
+        cache_entries.set(stats["size"], cache=name)
+    stream = availability_broadcaster.stats()
+    stream_subscribers.set(stream["subscribers"])
+    stream_evictions.set(stream["evictions"])
+    for writer in (occupancy_history.events, occupancy_history.rollups, audit_log):
+        stats = writer.stats()
+        history_pending.set(stats["pending"], table=writer.table)
+        history_written.set(stats["written"], table=writer.table)
+        history_dropped.set(stats["dropped"], table=writer.table)
+    for outcome, count in bus.stats().items():
+        bus_messages.set(count, outcome=outcome)
+
+# Per-process: with several workers each one reports its own counters
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return Response(registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/health/live", include_in_schema=False)
+async def live():
+    return {"status": "ok"}
+
+async def _check(call) -> str:
+    try:
+        result = await asyncio.wait_for(call, HEALTH_CHECK_TIMEOUT)
+    except Exception as e:
+        return repr(e)
+    # db helpers report failures in their response instead of raising
+    return (result or {}).get("error") or "ok"
+
+@app.get("/health/ready", include_in_schema=False)
+async def ready():
+    database, pubsub = await asyncio.gather(_check(db.ping()), _check(bus.ping()))
+    checks = {"database": database, "bus": pubsub}
+    ready = all(v == "ok" for v in checks.values())
+    return JSONResponse({"status": "ready" if ready else "unavailable", "checks": checks}, status_code=200 if ready else 503)
+
 app.include_router(user.router, prefix="/api/v1/user")
 app.include_router(admin.router, prefix="/api/v1/admin")
 app.include_router(parking.router, prefix="/api/v1/common/parking")
+app.include_router(parking.router_stream, prefix="/api/v1/common/parking")
 app.include_router(parking.router_guard, prefix="/api/v1/guard/parking")
 app.include_router(parking.router_admin, prefix="/api/v1/admin/parking")
\ No newline at end of file
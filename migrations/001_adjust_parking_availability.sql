@@ -0,0 +1,24 @@
+-- Atomically move a lot's availability by `delta`, keeping it within [0, capacity].
+-- Returns the lot row as jsonb with an extra "applied" flag, or null when the
+-- lot does not exist. When the change would leave the bounds the row is
+-- returned untouched with "applied" = false.
+create or replace function adjust_parking_availability(lot_code text, delta integer)
+returns jsonb
+language sql
+as $$
+    with updated as (
+        update parking_lot
+        set availability = availability + delta,
+            updated_at = now()
+        where code = lot_code
+          and availability + delta between 0 and capacity
+        returning *
+    )
+    select to_jsonb(u) || jsonb_build_object('applied', true)
+    from updated u
+    union all
+    select to_jsonb(p) || jsonb_build_object('applied', false)
+    from parking_lot p
+    where p.code = lot_code
+      and not exists (select 1 from updated)
+$$;
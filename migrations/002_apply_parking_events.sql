@@ -0,0 +1,45 @@
+-- Apply an ordered list of 'in'/'out' events to one lot with a single write.
+-- Each event follows the same clamping rules as adjust_parking_availability:
+-- an 'in' on a full lot or an 'out' on an empty lot is skipped. Returns the
+-- lot row as jsonb plus "results", one {applied, availability} object per
+-- event, or null when the lot does not exist.
+create or replace function apply_parking_events(lot_code text, events text[])
+returns jsonb
+language plpgsql
+as $$
+declare
+    lot parking_lot%rowtype;
+    event text;
+    applied boolean;
+    changed boolean := false;
+    results jsonb := '[]'::jsonb;
+begin
+    select * into lot from parking_lot where code = lot_code for update;
+    if not found then
+        return null;
+    end if;
+
+    foreach event in array events loop
+        applied := false;
+        if event = 'in' and lot.availability > 0 then
+            lot.availability := lot.availability - 1;
+            applied := true;
+        elsif event = 'out' and lot.availability < lot.capacity then
+            lot.availability := lot.availability + 1;
+            applied := true;
+        end if;
+        changed := changed or applied;
+        results := results || jsonb_build_object('applied', applied, 'availability', lot.availability);
+    end loop;
+
+    if changed then
+        update parking_lot
+        set availability = lot.availability,
+            updated_at = now()
+        where code = lot_code
+        returning * into lot;
+    end if;
+
+    return to_jsonb(lot) || jsonb_build_object('results', results);
+end;
+$$;
@@ -0,0 +1,29 @@
+-- Append-only log of availability changes, written in batches by the API.
+create table if not exists parking_lot_history (
+    id bigserial primary key,
+    lot_code text not null,
+    availability integer not null,
+    capacity integer not null,
+    recorded_at timestamptz not null
+);
+
+create index if not exists parking_lot_history_lot_time_idx
+    on parking_lot_history (lot_code, recorded_at);
+
+-- Per-lot minute/hour aggregates. Every API process writes its own partial row
+-- for a bucket; readers merge rows that share (lot_code, resolution, bucket_start).
+create table if not exists parking_lot_rollup (
+    id bigserial primary key,
+    lot_code text not null,
+    resolution text not null check (resolution in ('minute', 'hour')),
+    bucket_start timestamptz not null,
+    min_availability integer not null,
+    max_availability integer not null,
+    sum_availability bigint not null,
+    samples integer not null,
+    last_availability integer not null,
+    last_at timestamptz not null
+);
+
+create index if not exists parking_lot_rollup_lot_bucket_idx
+    on parking_lot_rollup (lot_code, resolution, bucket_start);
@@ -0,0 +1,20 @@
+-- Row version for optimistic concurrency. The trigger bumps it on every update,
+-- whichever path writes the row (PostgREST, the bulk helpers or the functions
+-- above), so clients can send it back as If-Match and get a 409 when the lot
+-- changed in between.
+alter table parking_lot add column if not exists version integer not null default 1;
+
+create or replace function bump_parking_lot_version()
+returns trigger
+language plpgsql
+as $$
+begin
+    new.version := old.version + 1;
+    return new;
+end;
+$$;
+
+drop trigger if exists parking_lot_version on parking_lot;
+create trigger parking_lot_version
+    before update on parking_lot
+    for each row execute function bump_parking_lot_version();
@@ -0,0 +1,14 @@
+-- Who changed what, written in batches by the API after each admin or guard change.
+create table if not exists audit_log (
+    id bigserial primary key,
+    actor_id text not null,
+    action text not null,
+    target_type text not null,
+    target_id text not null,
+    details jsonb,
+    created_at timestamptz not null
+);
+
+create index if not exists audit_log_actor_time_idx on audit_log (actor_id, created_at);
+create index if not exists audit_log_target_time_idx on audit_log (target_type, target_id, created_at);
+create index if not exists audit_log_time_idx on audit_log (created_at);
@@ -0,0 +1,6 @@
+-- Parking lots belong to a site (campus); employees may have a home site that
+-- scopes what the availability endpoints return to them. Null means every site.
+alter table parking_lot add column if not exists site text not null default 'main';
+alter table user_profile add column if not exists site text;
+
+create index if not exists parking_lot_site_type_idx on parking_lot (site, type);
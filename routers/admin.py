@@ -1,40 +1,123 @@
-from fastapi import Depends, HTTPException, APIRouter
-from baseConfig.dependencies import require_roles, get_current_user
-from baseConfig.db import fetch_all, update
-from baseConfig.models import UserFilter, UserListResponse, ApprovalUpdateRequest, RoleModificationRequest, userModResponse
+import asyncio
+from datetime import datetime
+from fastapi import BackgroundTasks, Depends, HTTPException, APIRouter, Query
+from fastapi.responses import StreamingResponse
+from baseConfig.dependencies import require_roles, get_current_user, user_cache, invalidate_user
+from baseConfig.db import fetch_all, fetch_one, update, update_many
+from typing import List, Literal, Optional
+from baseConfig.auth import hash_stats
+from baseConfig.audit import audit
+from baseConfig.lot_cache import parking_lots
+from baseConfig.forecast import availability_forecast
+from baseConfig.idempotency import idempotency
+from baseConfig.config import EXPORT_PAGE_SIZE, RATE_LIMIT_ADMIN
+from baseConfig.ratelimit import rate_limit
+from baseConfig.serialization import dumps
+from baseConfig.models import UserFilter, UserListRequest, UserListResponse, UserResponse, ApprovalUpdateRequest, RoleModificationRequest, SiteAssignmentRequest, userModResponse
 
 admin_role_required = require_roles(["admin"])
 
-router = APIRouter(tags=["Admin - User Management"])
+router = APIRouter(tags=["Admin - User Management"], dependencies=[Depends(rate_limit("admin", RATE_LIMIT_ADMIN))])
+
+# Only what UserResponse exposes (never the password hash), plus the pagination key
+USER_COLUMNS = ["id", *UserResponse.model_fields]
 
-@router.get("/approval_requests", dependencies=[Depends(admin_role_required)])
-def get_approval_requests(current_user=Depends(get_current_user)):
-    response = fetch_all(table="user_onboard", filters={"approval_status": "pending"})
 
+async def fetch_page(table: str, filters: dict, key: str, cursor=None, limit: int = 100, columns: list = None,
+                     gte: dict = None, lt: dict = None):
+    """One keyset page ordered by `key`, and the cursor for the next page (None on the last one)."""
+    response = await fetch_all(
+        table=table,
+        filters=filters,
+        columns=columns,
+        gte=gte,
+        lt=lt,
+        gt={key: cursor} if cursor is not None else None,
+        order_by=key,
+        limit=limit
+    )
     if response.get("error"):
         raise HTTPException(status_code=500, detail=response["error"])
+    rows = response.get("data") or []
+    next_cursor = rows[-1][key] if len(rows) == limit else None
+    return rows, next_cursor
+
+def stream_rows(first_page: list, next_cursor, fetch_next, export_format: str):
+    """Streams pages as NDJSON or a JSON array, fetching the next page only once the previous one is sent."""
+    async def body():
+        rows, cursor, first = first_page, next_cursor, True
+        if export_format == "json":
+            yield b"["
+        while True:
+            for row in rows:
+                if export_format == "json":
+                    yield (b"" if first else b",") + dumps(row)
+                    first = False
+                else:
+                    yield dumps(row) + b"\n"
+            if cursor is None:
+                break
+            rows, cursor = await fetch_next(cursor)
+        if export_format == "json":
+            yield b"]"
+
+    media_type = "application/json" if export_format == "json" else "application/x-ndjson"
+    return StreamingResponse(body(), media_type=media_type)
 
-    return {"approval_requests": response.get("data", [])}
+async def invalidate_rejected(rows: list):
+    """Revokes the cached profile and sessions of applicants just rejected, who may have been accepted before."""
+    employee_ids = {row["employee_id"] for row in rows if row.get("approval_status") == "rejected" and row.get("employee_id")}
+    profiles = await asyncio.gather(*(
+        fetch_one("user_profile", {"employee_id": employee_id}, columns=["id"]) for employee_id in employee_ids
+    ))
+    for profile in profiles:
+        if profile.get("data"):
+            invalidate_user(profile["data"]["id"])
+
+@router.get("/approval_requests", dependencies=[Depends(admin_role_required)])
+async def get_approval_requests(
+    cursor: Optional[int] = None,
+    limit: int = Query(default=100, ge=1, le=1000),
+    current_user=Depends(get_current_user)
+):
+    rows, next_cursor = await fetch_page(
+        "user_onboard", {"approval_status": "pending"}, key="request_id", cursor=cursor, limit=limit
+    )
+    return {"approval_requests": rows, "next_cursor": next_cursor}
 
 @router.post("/users", dependencies=[Depends(admin_role_required)], response_model=UserListResponse)
-def get_users(filters: UserFilter, current_user=Depends(get_current_user)):
+async def get_users(filters: UserListRequest, current_user=Depends(get_current_user)):
     # Convert Pydantic model to dict and remove None values
-    sanitized_filters = {k: v for k, v in filters.model_dump().items() if v is not None}
+    sanitized_filters = {k: v for k, v in filters.model_dump(exclude={"cursor", "limit"}).items() if v is not None}
 
-    response = fetch_all(table="user_profile", filters=sanitized_filters)
+    rows, next_cursor = await fetch_page(
+        "user_profile", sanitized_filters, key="id", cursor=filters.cursor, limit=filters.limit, columns=USER_COLUMNS
+    )
+    return UserListResponse(users=rows, next_cursor=next_cursor)
 
-    if response.get("error"):
-        raise HTTPException(status_code=500, detail=response["error"])
-    
-    if response.get("error"):
-        raise HTTPException(status_code=500, detail="Failed to fetch users")
+@router.get("/users/export", dependencies=[Depends(admin_role_required)])
+async def export_users(
+    filters: UserFilter = Depends(),
+    export_format: Literal["ndjson", "json"] = Query(default="ndjson", alias="format"),
+    current_user=Depends(get_current_user)
+):
+    """Every matching user, streamed page by page so memory stays flat regardless of org size."""
+    sanitized_filters = {k: v for k, v in filters.model_dump().items() if v is not None}
+
+    async def fetch_next(cursor):
+        rows, next_cursor = await fetch_page(
+            "user_profile", sanitized_filters, key="id", cursor=cursor, limit=EXPORT_PAGE_SIZE, columns=USER_COLUMNS
+        )
+        return [UserResponse(**row).model_dump() for row in rows], next_cursor
 
-    return UserListResponse(users=response.get("data", []))
+    # Fetch the first page up front so that errors still produce a proper status code
+    rows, next_cursor = await fetch_next(None)
+    return stream_rows(rows, next_cursor, fetch_next, export_format)
 
 @router.post("/approval_requests/update", dependencies=[Depends(admin_role_required)])
-def update_approval_status(req: ApprovalUpdateRequest, current_user=Depends(get_current_user)):
+async def update_approval_status(req: ApprovalUpdateRequest, background_tasks: BackgroundTasks, current_user=Depends(get_current_user)):
     # Update the approval_status field in user_onboard table
-    response = update(
+    response = await update(
         table="user_onboard",
         data={"approval_status": req.approval_status},
         filters={"request_id": req.request_id}
@@ -44,17 +127,46 @@ def update_approval_status(req: ApprovalUpdateRequest, current_user=Depends(get_
         raise HTTPException(status_code=500, detail=response["error"])
 
     data_set = response.get("data")[0]
+    await invalidate_rejected([data_set])
+    audit(background_tasks, current_user, "approval_status.update", "onboarding_request", req.request_id,
+          {"approval_status": req.approval_status})
     
     data_set.update({"message": "Approval status updated successfully"})
 
     # return userModResponse(**data_set)
     return data_set
 
+@router.post("/approval_requests/update_many", dependencies=[Depends(admin_role_required)])
+async def update_approval_statuses(
+    reqs: List[ApprovalUpdateRequest],
+    background_tasks: BackgroundTasks,
+    current_user=Depends(get_current_user)
+):
+    response = await update_many(
+        table="user_onboard",
+        rows=[{"request_id": req.request_id, "approval_status": req.approval_status} for req in reqs],
+        key="request_id"
+    )
+
+    if response.get("error"):
+        raise HTTPException(status_code=500, detail=response["error"])
+
+    await invalidate_rejected(response["data"])
+    updated = {row["request_id"] for row in response["data"]}
+    for row in response["data"]:
+        audit(background_tasks, current_user, "approval_status.update", "onboarding_request", row["request_id"],
+              {"approval_status": row["approval_status"]})
+    return {
+        "message": f"{len(updated)} approval requests updated successfully",
+        "updated": response["data"],
+        "not_found": [req.request_id for req in reqs if req.request_id not in updated]
+    }
+
 @router.post("/user_role/update", dependencies=[Depends(admin_role_required)])
-def update_role(req: RoleModificationRequest, current_user=Depends(get_current_user)):
+async def update_role(req: RoleModificationRequest, background_tasks: BackgroundTasks, current_user=Depends(get_current_user)):
     
     # Update the roles field in user_profile table
-    response = update(
+    response = await update(
         table="user_profile",
         data={"roles": req.user_role},
         filters={"employee_id": req.employee_id}
@@ -66,6 +178,65 @@ def update_role(req: RoleModificationRequest, current_user=Depends(get_current_u
     data_set = response.get("data")[0]
     if not data_set:
         raise HTTPException(status_code=404, detail="No matching user found for role update")
+    invalidate_user(data_set.get("id"))
+    audit(background_tasks, current_user, "user_role.update", "employee", req.employee_id, {"roles": req.user_role})
     
     data_set.update({"message": "User role updated successfully"})
-    return userModResponse(**data_set)
\ No newline at end of file
+    return userModResponse(**data_set)
+
+@router.post("/user_site/update", dependencies=[Depends(admin_role_required)])
+async def update_site(req: SiteAssignmentRequest, background_tasks: BackgroundTasks, current_user=Depends(get_current_user)):
+    """Sets the site a user's listings default to; sessions pick it up on their next /refresh."""
+    response = await update(
+        table="user_profile",
+        data={"site": req.site},
+        filters={"employee_id": req.employee_id}
+    )
+
+    if response.get("error"):
+        raise HTTPException(status_code=500, detail=response["error"])
+
+    if not response.get("data"):
+        raise HTTPException(status_code=404, detail="No matching user found for site update")
+    data_set = response["data"][0]
+    invalidate_user(data_set.get("id"))
+    audit(background_tasks, current_user, "user_site.update", "employee", req.employee_id, {"site": req.site})
+
+    data_set.update({"message": "User site updated successfully"})
+    return userModResponse(**data_set)
+
+@router.get("/audit_log", dependencies=[Depends(admin_role_required)])
+async def get_audit_log(
+    actor: Optional[str] = None,
+    lot: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    cursor: Optional[int] = None,
+    limit: int = Query(default=100, ge=1, le=1000),
+    current_user=Depends(get_current_user)
+):
+    """Audit records, oldest first, by actor (user id), parking lot code and time range."""
+    filters = {}
+    if actor:
+        filters["actor_id"] = actor
+    if lot:
+        filters.update({"target_type": "parking_lot", "target_id": lot})
+    rows, next_cursor = await fetch_page(
+        "audit_log", filters, key="id", cursor=cursor, limit=limit,
+        gte={"created_at": start.isoformat()} if start else None,
+        lt={"created_at": end.isoformat()} if end else None
+    )
+    return {"audit_log": rows, "next_cursor": next_cursor}
+
+@router.get("/cache_stats", dependencies=[Depends(admin_role_required)])
+async def get_cache_stats(current_user=Depends(get_current_user)):
+    return {
+        "user_cache": user_cache.stats(),
+        "parking_lots": parking_lots.stats(),
+        "forecast": availability_forecast.stats(),
+        "idempotency": idempotency.stats(),
+    }
+
+@router.get("/auth_stats", dependencies=[Depends(admin_role_required)])
+async def get_auth_stats(current_user=Depends(get_current_user)):
+    return {"password_hashing": hash_stats}
@@ -1,51 +1,137 @@
-from datetime import datetime
-from fastapi import Depends, HTTPException, APIRouter
-from typing import List
+import asyncio
+from datetime import datetime, timedelta, timezone
+from fastapi import BackgroundTasks, Depends, HTTPException, APIRouter, Header, Query, Request, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import Response, StreamingResponse
+from typing import List, Literal, Optional
 from baseConfig.dependencies import require_roles, get_current_user
-from baseConfig.db import fetch_one, fetch_all, update, insert
-from baseConfig.models import ParkingLotDetails, FullParkingLotResponse, ParkingLotUpdateRequest, ParkingAvailabilityResponse, UpdateAvailabilityRequest, UpdateAvailabilityResponse, BulkUpdateRequest
+from baseConfig.db import fetch_one, update, insert, rpc, insert_many, update_many
+from baseConfig.broadcast import availability_broadcaster
+from baseConfig.bus import bus
+from baseConfig.lot_cache import parking_lots, publish_lots
+from baseConfig.history import occupancy_history
+from baseConfig.forecast import availability_forecast
+from baseConfig.idempotency import idempotency
+from baseConfig.audit import audit
+from baseConfig.config import STREAM_KEEPALIVE, RATE_LIMIT_ADMIN, RATE_LIMIT_GUARD, RATE_LIMIT_COMMON
+from baseConfig.ratelimit import rate_limit
+from baseConfig.serialization import dumps, json_response
+from baseConfig.models import ParkingLotDetails, FullParkingLotResponse, ParkingLotUpdateRequest, ParkingAvailabilityResponse, UpdateAvailabilityRequest, UpdateAvailabilityResponse, BulkUpdateRequest, BatchUpdateAvailabilityRequest, BatchUpdateAvailabilityResponse, OccupancyHistoryResponse, ParkingForecastResponse, ReplayEventsRequest, ReplayEventsResponse
 
 admin_role_required = require_roles(["admin"])
 guard_role_required = require_roles(["guard"])
 common_role_required = require_roles(["employee", "guard"])
 
-router_admin = APIRouter(tags=["Admin - Parking Lot Management"], dependencies=[Depends(admin_role_required)])
-router_guard = APIRouter(tags=["Parking - Guard"], dependencies=[Depends(guard_role_required)])
-router = APIRouter(tags=["Parking"], dependencies=[Depends(common_role_required)])
+router_admin = APIRouter(tags=["Admin - Parking Lot Management"], dependencies=[Depends(rate_limit("admin", RATE_LIMIT_ADMIN)), Depends(admin_role_required)])
+router_guard = APIRouter(tags=["Parking - Guard"], dependencies=[Depends(rate_limit("guard", RATE_LIMIT_GUARD)), Depends(guard_role_required)])
+router = APIRouter(tags=["Parking"], dependencies=[Depends(rate_limit("common", RATE_LIMIT_COMMON)), Depends(common_role_required)])
+# WebSockets cannot carry the bearer header from browsers, so these routes authenticate themselves
+router_stream = APIRouter(tags=["Parking"])
 
 
-def get_parking_lot_by_code(code: str) -> FullParkingLotResponse:
-    response = fetch_one(table="parking_lot", filters={"code": code})
+async def snapshot_lot(code: str) -> dict:
+    """Reads one lot from the snapshot; writes use fetch_lot for the current version."""
+    lot = await parking_lots.get(code)
+    if not lot:
+        raise HTTPException(status_code=404, detail="Parking lot not found")
+    return lot
+
+async def get_parking_lot_by_code(code: str) -> FullParkingLotResponse:
+    return FullParkingLotResponse(**await snapshot_lot(code))
+
+def site_scope(site: Optional[str], current_user: dict) -> Optional[str]:
+    """The site a listing covers: `site` when given ("all" for every site), else the caller's home site."""
+    if site == "all":
+        return None
+    return site or current_user.get("site")
+
+def lot_etag(lot: dict) -> str:
+    return f'"{lot.get("version")}"'
+
+def _etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    return header.strip() == "*" or etag in (tag.strip().removeprefix("W/") for tag in header.split(","))
+
+def cached_json(request: Request, body: bytes, etag: str) -> Response:
+    """The JSON body with its ETag, or an empty 304 when If-None-Match shows the client already has it."""
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
+
+def if_match_version(if_match: Optional[str]) -> Optional[int]:
+    """The row version named by an If-Match header; None when absent or "*"."""
+    if if_match is None or if_match.strip() == "*":
+        return None
+    try:
+        return int(if_match.strip().removeprefix("W/").strip('"'))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="If-Match must be an ETag returned by this API")
+
+async def fetch_lot(code: str) -> dict:
+    """Reads one lot from the database (not the snapshot), so its version is current."""
+    response = await fetch_one(table="parking_lot", filters={"code": code})
     if response.get("error"):
         raise HTTPException(status_code=500, detail=response["error"])
     lot = response.get("data")
     if not lot:
         raise HTTPException(status_code=404, detail="Parking lot not found")
-    return FullParkingLotResponse(**lot)
+    parking_lots.put(lot)
+    return lot
 
-@router_admin.get("/parking_lots", response_model=List[FullParkingLotResponse])
-def get_parking_lots(current_user=Depends(get_current_user)):
-    response = fetch_all(table="parking_lot")
+async def update_lot_if_version(code: str, data: dict, version: Optional[int]) -> dict:
+    """Updates the lot only while its row still has `version` (unconditionally when None)."""
+    filters = {"code": code}
+    if version is not None:
+        filters["version"] = version
+    response = await update(table="parking_lot", data=data, filters=filters)
     if response.get("error"):
         raise HTTPException(status_code=500, detail=response["error"])
+    rows = response.get("data") or []
+    if not rows:
+        current = await fetch_lot(code)
+        raise HTTPException(
+            status_code=409,
+            detail="Parking lot was modified by someone else, reload it and retry",
+            headers={"ETag": lot_etag(current)}
+        )
+    publish_lots(rows[0])
+    return rows[0]
 
-    return response.get("data", [])
+def availability_changed(*lots: dict):
+    """Pushes changed lot rows to the stream subscribers of every worker and to the occupancy history."""
+    bus.publish("availability", {
+        "type": "delta",
+        "lots": [{k: lot.get(k) for k in ParkingAvailabilityResponse.model_fields} for lot in lots]
+    })
+    for lot in lots:
+        occupancy_history.record(lot)
+
+@router_admin.get("/parking_lots", response_model=List[FullParkingLotResponse])
+async def get_parking_lots(request: Request, site: Optional[str] = None, current_user=Depends(get_current_user)):
+    return cached_json(request, *await parking_lots.full_json(site))
+
+@router_admin.get("/parking_lot/{code}", response_model=FullParkingLotResponse)
+async def get_parking_lot(code: str, request: Request, current_user=Depends(get_current_user)):
+    lot = await snapshot_lot(code)
+    body = dumps({k: lot.get(k) for k in FullParkingLotResponse.model_fields})
+    return cached_json(request, body, lot_etag(lot))
 
 @router_admin.post("/add_parking_lot", dependencies=[Depends(admin_role_required)])
-def add_parking_lot(parking_lot: ParkingLotDetails, current_user=Depends(get_current_user)):
-    existing = fetch_one(table="parking_lot", filters={"code": parking_lot.code})
+async def add_parking_lot(parking_lot: ParkingLotDetails, background_tasks: BackgroundTasks, current_user=Depends(get_current_user)):
+    existing = await fetch_one(table="parking_lot", filters={"code": parking_lot.code}, columns=["code"])
     if existing.get("error"):
         raise HTTPException(status_code=500, detail=existing["error"])
     
     if existing.get("data"):
         raise HTTPException(status_code=400, detail="Parking lot already exists")
     
-    response = insert(
+    response = await insert(
         table="parking_lot", 
         data={
             "code": parking_lot.code,
             "name": parking_lot.name,
             "type": parking_lot.type.lower(),
+            "site": parking_lot.site,
             "capacity": parking_lot.capacity,
             "availability": parking_lot.capacity,
             "created_at": datetime.now().isoformat()
@@ -54,92 +140,391 @@ def add_parking_lot(parking_lot: ParkingLotDetails, current_user=Depends(get_cur
 
     if response.get("error"):
         raise HTTPException(status_code=500, detail=response.get("error"))
+    publish_lots(response["data"])
+    audit(background_tasks, current_user, "parking_lot.create", "parking_lot", parking_lot.code, parking_lot.model_dump())
     return {"message": "Parking lot added successfully"}
 
 @router_admin.post("/update_parking_lot", dependencies=[Depends(admin_role_required)])
-def update_parking_lot(parking_lot: ParkingLotUpdateRequest, current_user=Depends(get_current_user)):
-    existing = fetch_one(table="parking_lot", filters={"code": parking_lot.code})
-    if existing.get("error"):
-        raise HTTPException(status_code=500, detail=existing["error"])
-    
-    if not existing.get("data"):
-        raise HTTPException(status_code=404, detail="Parking lot not found")
-    
+async def update_parking_lot(
+    parking_lot: ParkingLotUpdateRequest,
+    response: Response,
+    background_tasks: BackgroundTasks,
+    if_match: Optional[str] = Header(default=None),
+    current_user=Depends(get_current_user)
+):
+    existing = await fetch_lot(parking_lot.code)
+    expected_version = if_match_version(if_match)
+    if expected_version is not None and expected_version != existing.get("version"):
+        raise HTTPException(status_code=409, detail="Parking lot was modified by someone else, reload it and retry", headers={"ETag": lot_etag(existing)})
+
     sanitized_data = {k: v for k, v in parking_lot.model_dump().items() if v is not None and k != "code"}
+    # Stored lowercase like add_parking_lot, which is what ?type= filters match
+    if "type" in sanitized_data:
+        sanitized_data["type"] = sanitized_data["type"].lower()
     if not sanitized_data:
         return {"message": "Nothing to Update"}
-    response = update(
-        table="parking_lot", 
-        data=sanitized_data,
-        filters={"code": parking_lot.code}
-    )
+    # Only conditional when the client asked for it: guard events bump the version too, and
+    # the fields edited here never include availability
+    lot = await update_lot_if_version(parking_lot.code, sanitized_data, expected_version)
+    response.headers["ETag"] = lot_etag(lot)
+    audit(background_tasks, current_user, "parking_lot.update", "parking_lot", parking_lot.code, sanitized_data)
+    return {"message": f"Parking lot: {parking_lot.code} successfully updated with {sanitized_data}"}
 
+@router_admin.post("/add_parking_lots")
+async def add_parking_lots(
+    new_lots: List[ParkingLotDetails],
+    background_tasks: BackgroundTasks,
+    current_user=Depends(get_current_user)
+):
+    codes = [lot.code for lot in new_lots]
+    if len(set(codes)) != len(codes):
+        raise HTTPException(status_code=400, detail="Duplicate parking lot codes in request")
+
+    # One read of the (small) table instead of a lookup per lot
+    parking_lots.invalidate()
+    existing = sorted({lot["code"] for lot in await parking_lots.all()} & set(codes))
+    if existing:
+        raise HTTPException(status_code=400, detail=f"Parking lots already exist: {existing}")
+
+    now = datetime.now().isoformat()
+    response = await insert_many(
+        table="parking_lot",
+        rows=[
+            {
+                "code": lot.code,
+                "name": lot.name,
+                "type": lot.type.lower(),
+                "site": lot.site,
+                "capacity": lot.capacity,
+                "availability": lot.capacity,
+                "created_at": now,
+                "updated_at": now
+            }
+            for lot in new_lots
+        ]
+    )
     if response.get("error"):
-        raise HTTPException(status_code=500, detail=response.get("error"))
-    return {"message": f"Parking lot: {parking_lot.code} successfully updated with {sanitized_data}"}
+        raise HTTPException(status_code=500, detail=response["error"])
+    for lot in response["data"]:
+        publish_lots(lot)
+    for lot in new_lots:
+        audit(background_tasks, current_user, "parking_lot.create", "parking_lot", lot.code, lot.model_dump())
+    return {"message": f"{len(response['data'])} parking lots added successfully"}
 
-@router.get("/availability", response_model=List[ParkingAvailabilityResponse])
-def check_availability(current_user=Depends(get_current_user)):
-    response = fetch_all(table="parking_lot")
+@router_admin.post("/update_parking_lots")
+async def update_parking_lots(
+    changes: List[ParkingLotUpdateRequest],
+    background_tasks: BackgroundTasks,
+    current_user=Depends(get_current_user)
+):
+    rows = []
+    for change in changes:
+        sanitized_data = {k: v for k, v in change.model_dump().items() if v is not None}
+        if "type" in sanitized_data:
+            sanitized_data["type"] = sanitized_data["type"].lower()
+        if len(sanitized_data) > 1:
+            rows.append(sanitized_data)
+    if not rows:
+        return {"message": "Nothing to Update", "updated": [], "not_found": []}
+
+    response = await update_many(table="parking_lot", rows=rows, key="code")
     if response.get("error"):
         raise HTTPException(status_code=500, detail=response["error"])
 
-    data_set = []
-    for lot in response.get("data", []):
-        data_set.append(ParkingAvailabilityResponse(**lot))
-    return data_set
+    for lot in response["data"]:
+        publish_lots(lot)
+    updated = sorted(lot["code"] for lot in response["data"])
+    for row in rows:
+        if row["code"] in updated:
+            audit(background_tasks, current_user, "parking_lot.update", "parking_lot", row["code"],
+                  {k: v for k, v in row.items() if k != "code"})
+    not_found = sorted({row["code"] for row in rows} - set(updated))
+    return {"message": f"{len(updated)} parking lots updated successfully", "updated": updated, "not_found": not_found}
 
-@router_guard.post("/update_availability", response_model=UpdateAvailabilityResponse)
-def update_availability(req: UpdateAvailabilityRequest, current_user=Depends(get_current_user)):
-    # Fetch current parking lot details
-    lot = get_parking_lot_by_code(req.parking_lot_code)
-    current_availability = lot.availability
-    capacity = lot.capacity
-    final_response = {
-        "code": lot.code,
-        "name": lot.name,
-        "type": lot.type,
-        "availability": current_availability,
-        "updated_at": lot.updated_at,
-        "message": None
-    }
+@router_admin.get("/occupancy", response_model=OccupancyHistoryResponse)
+async def get_occupancy_history(
+    code: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    resolution: Literal["raw", "minute", "hour"] = "hour",
+    current_user=Depends(get_current_user)
+):
+    """Availability over time for one lot; defaults to the last 24 hours. Naive times are UTC."""
+    end = end or datetime.now(timezone.utc)
+    start = start or end - timedelta(days=1)
+    if end.tzinfo is None:
+        end = end.replace(tzinfo=timezone.utc)
+    if start.tzinfo is None:
+        start = start.replace(tzinfo=timezone.utc)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
 
-    # Compute new availability
+    if resolution == "raw":
+        points = await occupancy_history.raw(code, start, end)
+    else:
+        points = await occupancy_history.rollup(code, start, end, resolution)
+    return json_response(
+        {"code": code, "resolution": resolution, "start": start.isoformat(), "end": end.isoformat(), "points": points},
+        OccupancyHistoryResponse
+    )
+
+@router.get("/availability", response_model=List[ParkingAvailabilityResponse])
+async def check_availability(
+    request: Request,
+    site: Optional[str] = None,
+    lot_type: Optional[str] = Query(default=None, alias="type"),
+    current_user=Depends(get_current_user)
+):
+    """Lots of the caller's site unless `site` names another one ("all" for every site), optionally of one type."""
+    scope = site_scope(site, current_user)
+    return cached_json(request, *await parking_lots.availability_json(scope, lot_type.lower() if lot_type else None))
+
+@router.get("/availability/stream")
+async def stream_availability(site: Optional[str] = None, current_user=Depends(get_current_user)):
+    """Server-sent events: one snapshot message, then a delta message per availability change.
+
+    Scoped to a site like /availability.
+    """
+    scope = site_scope(site, current_user)
+    subscription = availability_broadcaster.subscribe(scope)
+    try:
+        snapshot = await parking_lots.availability(scope)
+    except HTTPException:
+        availability_broadcaster.unsubscribe(subscription)
+        raise
+
+    async def events():
+        try:
+            yield f"data: {dumps({'type': 'snapshot', 'lots': snapshot}).decode()}\n\n"
+            while True:
+                try:
+                    message = await subscription.get(timeout=STREAM_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if message is None:
+                    return
+                yield f"data: {message}\n\n"
+        finally:
+            availability_broadcaster.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/availability/forecast", response_model=List[ParkingForecastResponse])
+async def forecast_availability(
+    request: Request,
+    site: Optional[str] = None,
+    lot_type: Optional[str] = Query(default=None, alias="type"),
+    current_user=Depends(get_current_user)
+):
+    """Expected availability at the configured horizons, from each lot's usual weekly pattern; scoped like /availability."""
+    scope = site_scope(site, current_user)
+    return cached_json(request, *await availability_forecast.forecast_json(scope, lot_type.lower() if lot_type else None))
+
+@router.get("/availability/{code}", response_model=ParkingAvailabilityResponse)
+async def check_lot_availability(code: str, request: Request, current_user=Depends(get_current_user)):
+    lot = await snapshot_lot(code)
+    body = dumps({k: lot.get(k) for k in ParkingAvailabilityResponse.model_fields})
+    return cached_json(request, body, lot_etag(lot))
+
+@router_stream.websocket("/availability/ws")
+async def availability_websocket(websocket: WebSocket, token: str, site: Optional[str] = None):
+    """Same messages as /availability/stream; the access token is passed as the `token` query parameter."""
+    try:
+        current_user = await get_current_user(token)
+        await common_role_required(current_user)
+    except HTTPException as e:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason=e.detail)
+        return
+
+    await websocket.accept()
+    scope = site_scope(site, current_user)
+    subscription = availability_broadcaster.subscribe(scope)
+    receiver = asyncio.ensure_future(websocket.receive())
+    try:
+        snapshot = await parking_lots.availability(scope)
+        await websocket.send_text(dumps({"type": "snapshot", "lots": snapshot}).decode())
+        while True:
+            getter = asyncio.ensure_future(subscription.get())
+            done, _ = await asyncio.wait({getter, receiver}, return_when=asyncio.FIRST_COMPLETED)
+            if getter not in done:
+                getter.cancel()
+            if receiver in done:
+                if receiver.result()["type"] == "websocket.disconnect":
+                    return
+                # Clients have nothing to say on this socket; ignore anything they send
+                receiver = asyncio.ensure_future(websocket.receive())
+            if getter in done:
+                message = getter.result()
+                if message is None:
+                    await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER, reason="Too slow, reconnect")
+                    return
+                await websocket.send_text(message)
+    except (WebSocketDisconnect, HTTPException):
+        pass
+    finally:
+        receiver.cancel()
+        availability_broadcaster.unsubscribe(subscription)
+
+async def apply_event(req: UpdateAvailabilityRequest) -> Response:
     if req.event_type.lower() == "in":
-        if current_availability <= 0:
-            final_response.update({"availability": 0, "message": "Parking lot is full"})
-            return UpdateAvailabilityResponse(**final_response)
-        new_availability = current_availability - 1
+        delta = -1
     elif req.event_type.lower() == "out":
-        if current_availability >= capacity:
-            final_response.update({"availability": capacity, "message": "Parking lot is empty"})
-            return UpdateAvailabilityResponse(**final_response)
-        new_availability = current_availability + 1
+        delta = 1
     else:
         raise HTTPException(status_code=400, detail="Invalid event type. Must be 'in' or 'out'")
 
-    # Update the parking lot availability
-    update_info = {"availability": new_availability, "updated_at": datetime.now().isoformat()}
-    update_response = update(
-        table="parking_lot",
-        data=update_info,
-        filters={"code": req.parking_lot_code}
-    )
+    # Apply the change server side in a single round trip, clamped to [0, capacity]
+    response = await rpc("adjust_parking_availability", {"lot_code": req.parking_lot_code, "delta": delta})
+    if response.get("error"):
+        raise HTTPException(status_code=500, detail=response["error"])
 
-    if update_response.get("error"):
-        raise HTTPException(status_code=500, detail=update_response["error"])
+    lot = response.get("data")
+    if not lot:
+        raise HTTPException(status_code=404, detail="Parking lot not found")
+    applied = lot.pop("applied")
+    publish_lots(lot)
 
-    final_response.update({
-        "availability": new_availability,
-        "updated_at": update_info["updated_at"],
+    final_response = {
+        "code": lot["code"],
+        "name": lot["name"],
+        "type": lot["type"],
+        "site": lot.get("site"),
+        "availability": lot["availability"],
+        "updated_at": lot["updated_at"],
+        "version": lot.get("version"),
         "message": "Availability updated successfully"
-    })
-    return UpdateAvailabilityResponse(**final_response)
+    }
+    if not applied:
+        final_response["message"] = "Parking lot is full" if delta < 0 else "Parking lot is empty"
+    else:
+        availability_changed(lot)
+    return json_response(final_response, UpdateAvailabilityResponse)
+
+@router_guard.post("/update_availability", response_model=UpdateAvailabilityResponse)
+async def update_availability(
+    req: UpdateAvailabilityRequest,
+    idempotency_key: Optional[str] = Header(default=None),
+    current_user=Depends(get_current_user)
+):
+    """A retry with the same Idempotency-Key gets the first answer back instead of counting the car twice."""
+    return await idempotency.run(
+        idempotency_key, f"{current_user['id']}:update_availability", req.model_dump(), lambda: apply_event(req)
+    )
+
+async def apply_events(events: list) -> tuple:
+    """Applies (lot code, event type) pairs in order, one round trip per lot.
+
+    Returns one result per event and the codes of the lots whose round trip failed.
+    """
+    # Group events per lot, keeping their order and their position in the list
+    events_by_lot = {}
+    for index, (code, event_type) in enumerate(events):
+        events_by_lot.setdefault(code, []).append((index, event_type.lower()))
+
+    codes = list(events_by_lot)
+    responses = await asyncio.gather(*(
+        rpc("apply_parking_events", {"lot_code": code, "events": [e for _, e in events_by_lot[code]]})
+        for code in codes
+    ))
+
+    results = [None] * len(events)
+    changed_lots = []
+    failed = set()
+    for code, response in zip(codes, responses):
+        lot = response.get("data")
+        changed = False
+        for position, (index, event_type) in enumerate(events_by_lot[code]):
+            result = {"parking_lot_code": code, "event_type": event_type, "applied": False}
+            if response.get("error"):
+                result["message"] = response["error"]
+                failed.add(code)
+            elif not lot:
+                result["message"] = "Parking lot not found"
+            else:
+                result.update(lot["results"][position])
+                if result["applied"]:
+                    result["message"] = "Availability updated successfully"
+                    changed = True
+                else:
+                    result["message"] = "Parking lot is full" if event_type == "in" else "Parking lot is empty"
+            results[index] = result
+
+        if lot:
+            lot.pop("results")
+            publish_lots(lot)
+            if changed:
+                changed_lots.append(lot)
+
+    if changed_lots:
+        availability_changed(*changed_lots)
+    return results, failed
+
+@router_guard.post("/update_availability/batch", response_model=BatchUpdateAvailabilityResponse)
+async def batch_update_availability(
+    req: BatchUpdateAvailabilityRequest,
+    idempotency_key: Optional[str] = Header(default=None),
+    current_user=Depends(get_current_user)
+):
+    async def handler():
+        results, _ = await apply_events([(event.parking_lot_code, event.event_type) for event in req.events])
+        return json_response({"results": results}, BatchUpdateAvailabilityResponse)
+
+    return await idempotency.run(idempotency_key, f"{current_user['id']}:update_availability/batch", req.model_dump(), handler)
+
+@router_guard.post("/update_availability/replay", response_model=ReplayEventsResponse)
+async def replay_events(req: ReplayEventsRequest, current_user=Depends(get_current_user)):
+    """Applies events a device queued while offline, oldest first, each event_id at most once.
+
+    Events received before (in an earlier replay or earlier in this one) are
+    reported as duplicates and not applied again; events that failed on our side
+    may be sent again.
+    """
+    results = [None] * len(req.events)
+    fresh, keys = [], []
+    for index in sorted(range(len(req.events)), key=lambda i: req.events[i].occurred_at.timestamp()):
+        event = req.events[index]
+        key = f"event:{current_user['id']}:{req.device_id}:{event.event_id}"
+        if await idempotency.reserve(key) is not None:
+            results[index] = {
+                "event_id": event.event_id,
+                "parking_lot_code": event.parking_lot_code,
+                "event_type": event.event_type,
+                "applied": False,
+                "duplicate": True,
+                "message": "Event already received"
+            }
+            continue
+        fresh.append(index)
+        keys.append(key)
+
+    try:
+        applied, failed = await apply_events([(req.events[i].parking_lot_code, req.events[i].event_type) for i in fresh])
+    except BaseException:
+        for key in keys:
+            await idempotency.release(key)
+        raise
+    for index, key, result in zip(fresh, keys, applied):
+        if result["parking_lot_code"] in failed:
+            await idempotency.release(key)
+        else:
+            await idempotency.complete(key, "done")
+        results[index] = {"event_id": req.events[index].event_id, **result, "duplicate": False}
+    return json_response({"results": results}, ReplayEventsResponse)
 
 @router_guard.post("/bulk_update", response_model=UpdateAvailabilityResponse)
-def bulk_update_availability(req: BulkUpdateRequest, current_user=Depends(get_current_user)):
+async def bulk_update_availability(
+    req: BulkUpdateRequest,
+    background_tasks: BackgroundTasks,
+    if_match: Optional[str] = Header(default=None),
+    current_user=Depends(get_current_user)
+):
     # Fetch current parking lot details
-    lot = get_parking_lot_by_code(req.parking_lot_code)
+    lot = await get_parking_lot_by_code(req.parking_lot_code)
     if req.new_availability < 0 or req.new_availability > lot.capacity:
         raise HTTPException(status_code=400, detail="New availability must be between 0 and the parking lot capacity")
     
@@ -147,29 +532,27 @@ def bulk_update_availability(req: BulkUpdateRequest, current_user=Depends(get_cu
         "code": lot.code,
         "name": lot.name,
         "type": lot.type,
+        "site": lot.site,
         "availability": lot.availability,
         "updated_at": lot.updated_at,
+        "version": lot.version,
         "message": None
     }
 
     # Update the parking lot availability
     update_info = {"availability": req.new_availability, "updated_at": datetime.now().isoformat()}
 
-    # Perform the update
-    response = update(
-        table="parking_lot",
-        data=update_info,
-        filters={"code": req.parking_lot_code}
-    )
-    
-    if response.get("error"):
-        raise HTTPException(status_code=500, detail=response["error"])
+    # Perform the update; with If-Match only if nobody changed the lot since the client read it
+    updated_lot = await update_lot_if_version(req.parking_lot_code, update_info, if_match_version(if_match))
+    availability_changed(updated_lot)
+    audit(background_tasks, current_user, "availability.override", "parking_lot", req.parking_lot_code,
+          {"from": lot.availability, "to": req.new_availability})
     
     final_response.update({
         "availability": req.new_availability,
         "updated_at": update_info["updated_at"],
+        "version": updated_lot.get("version"),
         "message": "Bulk Availability updated successfully"
     })
 
-    return UpdateAvailabilityResponse(**final_response)
-
+    return json_response(final_response, UpdateAvailabilityResponse, headers={"ETag": lot_etag(updated_lot)})
@@ -1,32 +1,40 @@
-from fastapi import APIRouter, HTTPException
-from baseConfig.db import fetch_one, insert
-from baseConfig.auth import hash_password, verify_password, create_access_token
-from baseConfig.models import SignupRequest, LoginRequest
+from fastapi import APIRouter, Depends, HTTPException
+from baseConfig.db import fetch_one, insert, update
+from baseConfig.auth import ahash_password, averify_password, create_access_token, create_refresh_token, decode_refresh_token
+from baseConfig.models import SignupRequest, LoginRequest, RefreshRequest
+from baseConfig.config import RATE_LIMIT_AUTH, RATE_LIMIT_LOGIN_ACCOUNT
+from baseConfig.ratelimit import rate_limit, ip_identity, login_identity, refresh_identity
 
 
 router = APIRouter(tags=["General"])
 
-@router.post("/signup")
-def signup(req: SignupRequest):
-    existing = fetch_one(table="user_profile", filters={"employee_id": req.employee_id})
+@router.post("/signup", dependencies=[Depends(rate_limit("auth", RATE_LIMIT_AUTH))])
+async def signup(req: SignupRequest):
+    existing = await fetch_one(table="user_profile", filters={"employee_id": req.employee_id}, columns=["id"])
     if existing.get("error"):
         raise HTTPException(status_code=500, detail=existing["error"])
     
     if existing.get("data"):
         raise HTTPException(status_code=400, detail="Employee already exists")
     
-    insert("user_profile", {
+    await insert("user_profile", {
         "employee_id": req.employee_id,
         "company_email": req.company_email,
-        "password": hash_password(req.password),
+        "password": await ahash_password(req.password),
         "roles": [req.user_role],
         "user_status": "pending"
     })
     return {"status": "signup_requested"}
 
-@router.post("/login")
-def login(req: LoginRequest):
-    response = fetch_one(table="user_profile", filters={"company_email": req.company_email})
+# Every attempt from an address counts against its bucket, however many accounts it tries
+@router.post("/login", dependencies=[
+    Depends(rate_limit("auth", RATE_LIMIT_AUTH, ip_identity)),
+    Depends(rate_limit("login_account", RATE_LIMIT_LOGIN_ACCOUNT, login_identity)),
+])
+async def login(req: LoginRequest):
+    response = await fetch_one(
+        table="user_profile", filters={"company_email": req.company_email}, columns=["id", "password", "roles", "user_status", "site"]
+    )
     if response.get("error"):
         raise HTTPException(status_code=500, detail=response["error"])
 
@@ -35,8 +43,31 @@ def login(req: LoginRequest):
     if not user or user["user_status"] != "active":
         raise HTTPException(status_code=403, detail="Invalid credentials or not approved")
     
-    if not verify_password(req.password, user["password"]):
+    valid, new_hash = await averify_password(req.password, user["password"])
+    if not valid:
         raise HTTPException(status_code=403, detail="Invalid credentials")
+
+    # Stored hash uses an outdated bcrypt cost; best effort, the login succeeds either way
+    if new_hash:
+        await update("user_profile", data={"password": new_hash}, filters={"id": user["id"]})
     
-    token = create_access_token(user_id=user["id"], roles=user["roles"])
-    return {"access_token": token, "roles": user["roles"]}
+    token = create_access_token(user_id=user["id"], roles=user["roles"], site=user.get("site"))
+    refresh_token = create_refresh_token(user_id=user["id"])
+    return {"access_token": token, "refresh_token": refresh_token, "roles": user["roles"]}
+
+@router.post("/refresh", dependencies=[Depends(rate_limit("auth", RATE_LIMIT_AUTH, refresh_identity))])
+async def refresh(req: RefreshRequest):
+    payload = decode_refresh_token(req.refresh_token)
+
+    # Always re-read the profile: this is where role and status changes reach stateless tokens
+    response = await fetch_one(table="user_profile", filters={"id": payload["sub"]}, columns=["id", "roles", "user_status", "site"])
+    if response.get("error"):
+        raise HTTPException(status_code=500, detail=response["error"])
+
+    user = response.get("data")
+    if not user or user["user_status"] != "active":
+        raise HTTPException(status_code=403, detail="User not approved")
+
+    token = create_access_token(user_id=user["id"], roles=user["roles"], site=user.get("site"))
+    refresh_token = create_refresh_token(user_id=user["id"])
+    return {"access_token": token, "refresh_token": refresh_token, "roles": user["roles"]}
@@ -0,0 +1,19 @@
+import statistics
+
+import pytest
+
+import startup_time
+
+
+@pytest.fixture
+def memory_backend(monkeypatch):
+    for name in ("DATABASE_URL", "SUPABASE_URL", "SUPABASE_KEY", "BUS_URL"):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv("DB_BACKEND", "memory")
+
+
+def test_startup_within_budget(memory_backend):
+    # Median of a few fresh interpreters, so one slow run on a busy machine does not fail the build
+    runs = [startup_time.measure() for _ in range(3)]
+    median = statistics.median(run["startup"] for run in runs)
+    assert median <= startup_time.BUDGET, f"median startup {median:.3f}s exceeds the {startup_time.BUDGET}s budget"